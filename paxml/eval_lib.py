@@ -17,6 +17,7 @@
 
 import abc
 import collections
+import concurrent
 import contextlib
 import functools
 import gc
@@ -31,7 +32,6 @@ from clu import platform
 from etils import epath
 import jax
 from jax.experimental import multihost_utils
-import jax.numpy as jnp
 import numpy as np
 from paxml import base_experiment
 from paxml import base_metrics
@@ -47,6 +47,7 @@ from paxml import tuning_lib
 from praxis import base_hyperparams
 from praxis import base_input
 from praxis import base_layer
+from praxis import base_model
 from praxis import optimizer_prefix_vectorization
 from praxis import py_utils
 from praxis import pytypes
@@ -76,6 +77,17 @@ PRNGKey = pytypes.PRNGKey
 NestedShapeDtypeLike = pytypes.NestedShapeDtypeLike
 NO_PREFIX_KEY = optimizer_prefix_vectorization.NO_PREFIX_KEY
 
+flags.DEFINE_integer(
+    'pax_eval_input_prefetch_depth', 2,
+    'Number of eval/decode input batches fetched ahead in a background thread '
+    'while the current batch is processed. 0 fetches them synchronously.')
+flags.DEFINE_bool(
+    'pax_decode_output_float16', False,
+    'If True, the float values of the written decoder outputs are stored as '
+    'float16, which halves the size of their .pickle file. The .jsonl file '
+    'only holds the rounded values. Values beyond the float16 range become '
+    'inf.')
+
 
 def _is_vectorized(states: train_states.TrainState) -> bool:
   """Determines whether it is a vectorized model."""
@@ -85,6 +97,120 @@ def _is_vectorized(states: train_states.TrainState) -> bool:
   return NO_PREFIX_KEY in states.opt_states[0]
 
 
+class _InputPrefetcher:
+  """Fetches the next batches of an input in a background thread.
+
+  A single worker calls `get_next` so that the host materializes the next
+  batches while the current one is being processed. No more than
+  `num_batches` batches are ever fetched, and once a fetch raises (e.g. the
+  input is exhausted), the fetches queued behind it are cancelled. Only one
+  that the worker already started may still run.
+  """
+
+  def __init__(
+      self,
+      get_next: Callable[[], NestedJTensor],
+      num_batches: int,
+      depth: int,
+  ):
+    """Constructor.
+
+    Args:
+      get_next: Returns the next batch of the input, e.g. its
+        `get_next_padded`.
+      num_batches: The number of batches to fetch, or < 0 to fetch until the
+        input is exhausted.
+      depth: The maximum number of batches fetched ahead. With 0, batches are
+        fetched synchronously in `get_next()`.
+    """
+    self._get_next = get_next
+    self._remaining = num_batches
+    self._depth = depth
+    self._pool = None
+    self._futures = collections.deque()
+    if depth > 0:
+      self._pool = concurrent.futures.ThreadPoolExecutor(
+          max_workers=1, thread_name_prefix='EvalInputPrefetcher')
+      self._fill()
+
+  def _fill(self) -> None:
+    while len(self._futures) < self._depth and self._remaining != 0:
+      self._futures.append(self._pool.submit(self._get_next))
+      self._remaining -= 1
+
+  def get_next(self) -> NestedJTensor:
+    if self._pool is None:
+      return self._get_next()
+    try:
+      batch = self._futures.popleft().result()  # Reraises any fetch error.
+    except BaseException:
+      self._remaining = 0
+      for future in self._futures:
+        future.cancel()
+      self._futures.clear()
+      raise
+    self._fill()
+    return batch
+
+  def close(self) -> None:
+    """Stops fetching, and waits for the in-flight fetch to finish if any."""
+    for future in self._futures:
+      future.cancel()
+    self._futures.clear()
+    if self._pool is not None:
+      self._pool.shutdown(wait=True)
+      self._pool = None
+
+
+def _get_next_preprocessed(
+    partitioner: trainer_lib.Partitioner,
+    inp: base_input.BaseInput,
+    partition_specs: Optional[NestedPartitionSpec] = None,
+    padded: bool = False) -> NestedJTensor:
+  """Returns the next batch of `inp`, ready for the partitioned step fn."""
+  batch = inp.get_next_padded() if padded else inp.get_next()
+  return partitioner.preprocess_inputs(inp, batch, partition_specs)
+
+
+# The eval/decode summaries of a split are all written at once at its end, so
+# they are buffered and flushed together rather than every 10 summaries.
+_SUMMARY_WRITER_MAX_QUEUE = 1000
+
+# The maximum number of decoded batches waiting for `process_decode_out`.
+_MAX_PENDING_PROCESS_DECODE_OUT = 2
+
+# The maximum number of eval steps whose scoring outputs wait to be written.
+_MAX_PENDING_SCORING_OUTPUT_WRITES = 2
+
+# The number of eval steps the metric buffers of a split are first allocated
+# for, when its number of steps is not known. They grow as needed.
+_EVAL_METRIC_BUFFER_CAPACITY = 4096
+
+
+def _copy_to_host_async(tree: Any) -> None:
+  """Starts the device-to-host copy of the arrays of `tree`."""
+  for x in jax.tree_util.tree_leaves(tree):
+    if isinstance(x, jax.Array):
+      x.copy_to_host_async()
+
+
+def _process_decode_out(
+    model: base_model.BaseModel, inp: base_input.BaseInput,
+    decode_out: NestedMap, batch_idx: int
+) -> Tuple[WeightedScalars, Sequence[Tuple[str, Any]], Metrics]:
+  """Runs `model.process_decode_out` on CPU on the decode outputs."""
+  # Waits for the transfer started by the decode loop, then frees the device
+  # buffers.
+  decode_out = jax.tree_map(np.asarray, decode_out)
+  with jax.default_device(jax.devices('cpu')[0]):
+    (processed_scalars, processed_out,
+     processed_metric_updates) = model.process_decode_out(inp, decode_out)
+  processed_out = seqio_input.maybe_update_decode_output_keys(
+      processed_out, decode_out)
+  logging.info('Finished processing decoded input batch %d', batch_idx)
+  return processed_scalars, processed_out, processed_metric_updates
+
+
 def _get_dir_names(
     input_p: Sequence[base_input.BaseInput.HParams]) -> Sequence[epath.Path]:
   """Returns a list of same length for parent dir names for each dataset."""
@@ -98,18 +224,109 @@ def _get_filename(step: Union[base_layer.JTensorOrPartitionSpec, int],
   return f'{prefix}_out_{step_num}_shard_{jax.process_index()}'
 
 
-def _can_load_written_outputs(basedir: epath.Path, pname: str,
-                              mode: EvaluationMode, step: int) -> bool:
-  """Returns whether we can load the eval/decoder outputs already."""
-  success = np.array([0], dtype=np.int32)
+def _broadcast_from_leader(x: np.ndarray) -> np.ndarray:
+  """Broadcasts `x` from the leader; a no-op with a single process."""
+  if jax.process_count() == 1:
+    return x
+  return multihost_utils.broadcast_one_to_all(x)
+
+
+def _can_load_written_outputs_batch(basedir: epath.Path,
+                                    pnames: Sequence[str],
+                                    mode: EvaluationMode,
+                                    step: int) -> np.ndarray:
+  """Returns whether we can load the outputs of each of `pnames` already.
+
+  All the datasets are probed by the leader and the result is broadcast once,
+  instead of once per dataset.
+
+  Args:
+    basedir: The job log dir used when running the eval/decoder.
+    pnames: Names of the datasets, usually `p.name` of the input params.
+    mode: The mode the outputs were written in.
+    step: The model step at which the outputs were written.
+
+  Returns:
+    A boolean array aligned with `pnames`.
+  """
+  if not pnames:
+    return np.zeros([0], dtype=bool)
+  success = np.zeros([len(pnames)], dtype=np.int32)
   if jax.process_index() == 0:
-    try:
-      outputs = io_utils.load_outputs(basedir, pname, mode.value, step)
-      success[0] = len(outputs)
-    except Exception:  # pylint: disable=broad-except
-      pass
-  out = multihost_utils.broadcast_one_to_all(success)
-  return out[0] > 0
+    for i, pname in enumerate(pnames):
+      try:
+        outputs = io_utils.load_outputs(basedir, pname, mode.value, step)
+        success[i] = len(outputs)
+      except Exception:  # pylint: disable=broad-except
+        pass
+  out = _broadcast_from_leader(success)
+  return out > 0
+
+
+def _flatten_scoring_outputs(
+    per_example_scores: Sequence[NestedMap]) -> List[Tuple[str, Any]]:
+  """Flattens batches of per-example host outputs into (enum id, example)."""
+  if not per_example_scores:
+    return []
+  # Concatenates the batches along the batch axis first, so that the flattened
+  # array of single example outputs is unstacked at once.
+  all_scores = jax.tree_map(lambda *xs: np.concatenate(xs, axis=0),
+                            *per_example_scores)
+  # The enumeration ids only depend on the few provenance fields, so they are
+  # computed from those rather than from the full per-example outputs.
+  enum_key_fields = py_utils.filter_by_matching_keys(
+      all_scores, [py_utils.PROVENANCE_PREFIX])[0]
+  leaves, treedef = jax.tree_util.tree_flatten(all_scores)
+  # Slices every leaf into rows once and rebuilds each example from its row.
+  examples = [
+      jax.tree_util.tree_unflatten(treedef, row)
+      for row in zip(*(list(leaf) for leaf in leaves))
+  ]
+  if not enum_key_fields:
+    return [(py_utils.get_enumeration_id(ex), ex) for ex in examples]
+  return [
+      (py_utils.get_enumeration_id(enum_ex), ex)
+      for enum_ex, ex in zip(
+          py_utils.tree_unstack(enum_key_fields, 0), examples)
+  ]
+
+
+def _append_eval_step_outputs(
+    step_outputs: Tuple[List[Any], List[Any], Optional[NestedMap]],
+    summary_values: List[List[Any]],
+    metric_values: List[metric_utils.WeightedScalarBuffer],
+    per_example_scores: List[NestedMap]) -> None:
+  """Appends the host values of one eval step's outputs to the split's lists."""
+  # Waits for the transfer started by the eval loop, then frees the device
+  # buffers.
+  step_summaries, step_metrics, per_example_output = jax.device_get(
+      step_outputs)
+  for values, v in zip(summary_values, step_summaries):
+    values.append(v)
+  for values, v in zip(metric_values, step_metrics):
+    values.append(v)
+  if per_example_output is not None:
+    per_example_scores.append(per_example_output)
+
+
+def _write_scoring_outputs_batch(writer: io_utils.KeyValuePairsWriter,
+                                 per_example_output: NestedMap) -> None:
+  """Appends the scoring outputs of one eval step to `writer`."""
+  # Waits for the transfer started by the eval loop.
+  writer.write(_flatten_scoring_outputs([jax.device_get(per_example_output)]))
+
+
+def _maybe_open_scoring_outputs_writer(
+    output_dir: epath.Path,
+    step: int) -> Optional[io_utils.KeyValuePairsWriter]:
+  """Opens a writer of the model scoring outputs from leader process."""
+  if (jax.process_index() != 0 or flags.FLAGS.pax_only_aggregate_summaries):
+    return None
+
+  fq_fname = output_dir / _get_filename(step, EvaluationMode.EVAL.value)
+  fq_fname.parent.mkdir(parents=True, exist_ok=True)
+  logging.info('Writing eval outputs to %s as they come', fq_fname)
+  return io_utils.KeyValuePairsWriter(fq_fname)
 
 
 def _maybe_write_scoring_outputs(
@@ -133,11 +350,11 @@ def _wait_until_step(checkpointer, start_step):
   if not start_step:
     return
 
-  while True:
-    cur_step = checkpointer.retrieve_latest_checkpoint_step()
-    if cur_step is not None and start_step <= cur_step:
-      break
-    time.sleep(300)
+  checkpointer.wait_for_step(
+      lambda cur_step: cur_step is not None and start_step <= cur_step,
+      min_sleep_secs=5,
+      max_sleep_secs=300,
+  )
 
 
 def has_ema(task_p: tasks_lib.SingleTask.HParams) -> bool:
@@ -145,6 +362,24 @@ def has_ema(task_p: tasks_lib.SingleTask.HParams) -> bool:
   return task_p.train.learner.optimizer.ema_decay > 0.
 
 
+@functools.lru_cache(maxsize=8)
+def _get_ema_treedef(
+    structure: jax.tree_util.PyTreeDef) -> jax.tree_util.PyTreeDef:
+  """Returns the treedef of an ema state treating masked nodes as leaves.
+
+  The result only depends on the plain structure of the ema state, which is
+  fixed by the optimizer config, so the `is_leaf` predicate is only run once
+  per structure rather than on every node of every restored state.
+
+  Args:
+    structure: The plain (`jax.tree_util.tree_structure`) treedef of the ema.
+  """
+  placeholder = jax.tree_util.tree_unflatten(
+      structure, [0] * structure.num_leaves)
+  return jax.tree_util.tree_structure(
+      placeholder, is_leaf=py_utils.is_optax_masked_node)
+
+
 def extract_ema(
     model_states: train_states.TrainState) -> train_states.TrainState:
   """Finds the ema state from optimizer states."""
@@ -157,26 +392,31 @@ def extract_ema(
       if isinstance(v, dict) and 'ema' in v:
         return TrainState(step=model_states.step, mdl_vars=v.ema, opt_states={})
   else:
-    ret = None
+    ret_leaves = None
+    treedef = None
     # For vectorized model, the structure looks like this:
     # opt_states: [{'no_prefix': ({'count': '', 'ema': {'params': {'ctcloss':
     # It is a list of dictionaries. The key corresponds to the #stages.
     # Here the ema is constructed by combining the ema state from all those
     # dictionaries. Each parameter belongs to one dictionary and is labelled as
     # masked node in others.
+    # All the ema states share the same structure, so they are all flattened
+    # up to the same treedef (treating masked nodes as leaves), then merged
+    # leaf by leaf.
     for item in model_states.opt_states[0].values():
       if isinstance(item, tuple):
         for v in item:
           if isinstance(v, dict) and 'ema' in v:
-            if ret is None:
-              ret = v.ema
+            if ret_leaves is None:
+              treedef = _get_ema_treedef(jax.tree_util.tree_structure(v.ema))
+              ret_leaves = treedef.flatten_up_to(v.ema)
             else:
-              ret = jax.tree_map(
-                  lambda x, y: y if py_utils.is_optax_masked_node(x) else x,
-                  ret,
-                  v.ema,
-                  is_leaf=py_utils.is_optax_masked_node)
-    if ret is not None:
+              ret_leaves = [
+                  y if py_utils.is_optax_masked_node(x) else x
+                  for x, y in zip(ret_leaves, treedef.flatten_up_to(v.ema))
+              ]
+    if ret_leaves is not None:
+      ret = jax.tree_util.tree_unflatten(treedef, ret_leaves)
       return TrainState(step=model_states.step, mdl_vars=ret, opt_states={})
   raise ValueError('Could not find EMA states in `%r`.' %
                    model_states.opt_states)
@@ -222,17 +462,97 @@ class _EvalCheckpointer(metaclass=abc.ABCMeta):
     self.restore_checkpoint_dir: epath.Path = restore_checkpoint_dir
     self.restore_checkpoint_step: int = restore_checkpoint_step
     self.use_ema: bool = has_ema(jax_task.hparams)
+    self._last_checkpoint_dir_mtime: Optional[float] = None
 
   def retrieve_latest_checkpoint_step(self) -> Optional[int]:
     return checkpoints.retrieve_latest_checkpoint_step(
         self.restore_checkpoint_dir)
 
+  def _poll_checkpoint_dir(
+      self, force_read: bool) -> Tuple[bool, bool, Optional[int]]:
+    """Polls `restore_checkpoint_dir` for its latest checkpoint step.
+
+    Only the leader stats the directory and, if it changed since the last poll,
+    if its mtime is not available or if `force_read` is set, reads the latest
+    checkpoint step. Both are broadcast, so that all processes agree on the
+    step to restore next.
+
+    Args:
+      force_read: Whether to read the latest checkpoint step even if the
+        directory did not change.
+
+    Returns:
+      A tuple (changed, read, step): whether the directory changed, whether the
+      latest checkpoint step was read, and that step (None if it was not read
+      or if there is no checkpoint).
+    """
+    # (changed, read, step), with step = -1 for no checkpoint.
+    poll = np.array([0, 0, -1], dtype=np.int32)
+    if jax.process_index() == 0:
+      try:
+        mtime = self.restore_checkpoint_dir.stat().mtime
+      except Exception:  # pylint: disable=broad-except
+        # The directory is missing or its mtime is not reported: the step is
+        # read on every poll, but the directory is not reported as changed,
+        # so the backoff keeps growing.
+        mtime = None
+      if mtime is not None and mtime != self._last_checkpoint_dir_mtime:
+        self._last_checkpoint_dir_mtime = mtime
+        poll[0] = 1
+      if poll[0] or mtime is None or force_read:
+        poll[1] = 1
+        step = self.retrieve_latest_checkpoint_step()
+        if step is not None:
+          poll[2] = step
+    changed, read, step = _broadcast_from_leader(poll)
+    return bool(changed), bool(read), None if step < 0 else int(step)
+
+  def wait_for_step(
+      self,
+      is_ready: Callable[[Optional[int]], bool],
+      min_sleep_secs: float,
+      max_sleep_secs: float,
+  ) -> Optional[int]:
+    """Waits until the latest checkpoint step satisfies `is_ready`.
+
+    The latest checkpoint step is read on the first poll, and then only when
+    the checkpoint directory changed or once the backoff is capped, unless the
+    directory mtime is not available (e.g. on some object stores), in which
+    case it is read on every poll. The sleep between polls grows exponentially
+    from `min_sleep_secs` up to `max_sleep_secs` and is reset whenever the
+    directory changes.
+
+    Args:
+      is_ready: Predicate on the latest checkpoint step (or None).
+      min_sleep_secs: Initial sleep between two polls.
+      max_sleep_secs: Upper bound of the sleep between two polls.
+
+    Returns:
+      The latest checkpoint step satisfying `is_ready`.
+    """
+    sleep_secs = min_sleep_secs
+    first_poll = True
+    while True:
+      # Once the backoff is capped, the step is re-read regardless, in case the
+      # change happened within the filesystem's mtime granularity.
+      changed, read, checkpoint_step = self._poll_checkpoint_dir(
+          force_read=first_poll or sleep_secs >= max_sleep_secs)
+      first_poll = False
+      if read and is_ready(checkpoint_step):
+        return checkpoint_step
+      if changed:
+        sleep_secs = min_sleep_secs
+      logging.info('Sleep %.1fs before checking for new latest checkpoint.',
+                   sleep_secs)
+      time.sleep(sleep_secs)
+      sleep_secs = min(max_sleep_secs, sleep_secs * 1.5)
+
   def wait_for_new_step(self, last_checkpoint_step: int) -> int:
-    new_checkpoint_step = self.retrieve_latest_checkpoint_step()
-    while new_checkpoint_step == last_checkpoint_step:
-      logging.info('Sleep before checking for new latest checkpoint.')
-      time.sleep(60)
-      new_checkpoint_step = self.retrieve_latest_checkpoint_step()
+    new_checkpoint_step = self.wait_for_step(
+        lambda step: step != last_checkpoint_step,
+        min_sleep_secs=1,
+        max_sleep_secs=60,
+    )
     # There must be a new checkpoint here.
     assert new_checkpoint_step is not None
     logging.info('Found new checkpoint at step: %d', new_checkpoint_step)
@@ -509,113 +829,194 @@ def run_eval_loop_over_test_splits(
   eval_metrics_list = []
   eval_scoring_metrics_list = []
   num_eval_steps = []
-  for split, num_split_steps in enumerate(num_steps):
-    if _can_load_written_outputs(job_log_dir, model_inputs[split].hparams.name,
-                                 EvaluationMode.EVAL, step):
-      logging.info('Eval on input %s at step %d already done, skipping.',
-                   model_inputs[split].hparams.name, step)
-      eval_metrics_list.append(None)
-      eval_scoring_metrics_list.append(None)
-      num_eval_steps.append(0)
-      continue
-
-    logging.info('Starting eval data split=%d (%s) with num_steps=%d',
-                 split, model_inputs[split].hparams.name, num_split_steps)
-    # Reset loss and summary tensors for each test split.
-    loss = []
-    summary_tensors = {}
-    metrics = collections.defaultdict(list)
-    step_num = 0
-    per_example_scores = []
-    # Use num_split_steps < 0 to indicate running all of the input until
-    # out of range.
-    while num_split_steps < 0 or step_num < num_split_steps:
-      step_num += 1
-      try:
-        eval_inputs = model_inputs[split].get_next_padded()
-      except (tf.errors.OutOfRangeError, StopIteration):
-        if num_split_steps > 0:
-          raise
-        logging.info('Exhausted eval data split=%d after %d steps', split,
-                     step_num - 1)
-        model_inputs[split].reset()
-        break
+  can_load_written_outputs = _can_load_written_outputs_batch(
+      job_log_dir, [inp.hparams.name for inp in model_inputs],
+      EvaluationMode.EVAL, step)
+  # The summaries and scoring outputs of a split are written in the background
+  # while the next split is evaluated. A single worker keeps them in order.
+  io_pool = concurrent.futures.ThreadPoolExecutor(
+      max_workers=1, thread_name_prefix='EvalOutputsWriter')
+  io_futures = []
+  # The scoring output writes not known to be done yet, oldest first.
+  scoring_write_futures = collections.deque()
+  prefetcher = None
+  try:
+    for split, num_split_steps in enumerate(num_steps):
+      if can_load_written_outputs[split]:
+        logging.info('Eval on input %s at step %d already done, skipping.',
+                     model_inputs[split].hparams.name, step)
+        eval_metrics_list.append(None)
+        eval_scoring_metrics_list.append(None)
+        num_eval_steps.append(0)
+        continue
 
-      eval_inputs = partitioner.preprocess_inputs(
-          model_inputs[split],
-          eval_inputs,
-          eval_inputs_pspecs[split] if eval_inputs_pspecs else None,
-      )
-      # TODO(bencaine): Rename eval_metrics here weighted scalars?
-      (
-          eval_loss,
-          eval_metrics,
-          per_example_output,
-          eval_summary_tensors,
-      ) = eval_steps[split](
-          eval_inputs,
-          model_inputs[split].get_global_batch_size(
-              model_inputs[split].hparams
-          ),
-      )
+      logging.info('Starting eval data split=%d (%s) with num_steps=%d',
+                   split, model_inputs[split].hparams.name, num_split_steps)
+      # Reset loss and summary tensors for each test split. The loss is only
+      # needed as a mean, so a running sum is kept (on device) instead of every
+      # step's value.
+      loss_sum = None
+      num_losses = 0
+      # The summary and metric keys are fixed by the model: they are recorded on
+      # the first step and later values are appended by position.
+      summary_keys = None
+      summary_values = []
+      metric_keys = None
+      metric_values = []
+      step_num = 0
+      per_example_scores = []
+      # The outputs of the previous step, still on device.
+      pending_step_outputs = None
+      output_dir = (job_log_dir / f'{EvaluationMode.EVAL.value}_out'
+                    / model_inputs[split].hparams.name)
+      # Computing the SeqIO metrics needs all the scoring outputs at once.
+      # Otherwise, the leader passes them to its writer as they come, and
+      # the other processes don't keep them at all.
+      should_process_outputs = seqio_input.should_process_outputs(
+          model_inputs[split])
+      scoring_outputs_writer = None
+      if not should_process_outputs:
+        scoring_outputs_writer = _maybe_open_scoring_outputs_writer(
+            output_dir, step)
+      # These are fixed for the whole split, so resolve them once.
+      inputs_pspecs = eval_inputs_pspecs[split] if eval_inputs_pspecs else None
+      unpadded_global_batch_size = model_inputs[split].get_global_batch_size(
+          model_inputs[split].hparams)
+      # The next batches are read while the current one is evaluated.
+      prefetcher = _InputPrefetcher(
+          model_inputs[split].get_next_padded, num_split_steps,
+          flags.FLAGS.pax_eval_input_prefetch_depth)
+      # Use num_split_steps < 0 to indicate running all of the input until
+      # out of range.
+      while num_split_steps < 0 or step_num < num_split_steps:
+        step_num += 1
+        try:
+          eval_inputs = prefetcher.get_next()
+        except (tf.errors.OutOfRangeError, StopIteration):
+          prefetcher.close()
+          if num_split_steps > 0:
+            raise
+          logging.info('Exhausted eval data split=%d after %d steps', split,
+                       step_num - 1)
+          model_inputs[split].reset()
+          break
 
-      logging.info('Finished eval step on input batch %d for %s',
-                   step_num, model_inputs[split].hparams.name)
-
-      eval_loss = py_utils.maybe_unreplicate_for_fully_replicated(eval_loss)
-      eval_metrics = py_utils.maybe_unreplicate_for_fully_replicated(
-          eval_metrics)
-      per_example_output = py_utils.maybe_unreplicate_for_fully_replicated(
-          per_example_output)
-      eval_summary_tensors = py_utils.maybe_unreplicate_for_fully_replicated(
-          eval_summary_tensors)
-      per_example_scores.append(jax.tree_map(np.asarray, per_example_output))
-      loss += [eval_loss]
-      eval_summary_tensors = summary_utils.flatten_summary_dict(
-          eval_summary_tensors)
-      for k, v in eval_summary_tensors:
-        if k in summary_tensors:
-          summary_tensors[k] += [v]
-        else:
-          summary_tensors[k] = [v]
-      for k in eval_metrics:
-        metrics[k].append(eval_metrics[k])
-
-    logging.info('Finished eval on input %s', model_inputs[split].hparams.name)
-    # Flatten scoring outputs to simplify input for metrics eval computation.
-    # Constructs a new flattened array of single example outputs from original
-    # array containing batches of outputs.
-    flat_scoring_outputs = []
-    for batch in per_example_scores:
-      for ex in py_utils.tree_unstack(batch, 0):
-        flat_scoring_outputs.append((py_utils.get_enumeration_id(ex), ex))
-    eval_scoring_metrics = None
-    output_dir = (job_log_dir / f'{EvaluationMode.EVAL.value}_out'
-                  / model_inputs[split].hparams.name)
-    if seqio_input.should_process_outputs(model_inputs[split]):
-      eval_scoring_metrics = seqio_input.process_outputs(
-          model_inputs[split], flat_scoring_outputs, summary_writers[split],
-          seqio_input.MetricType.SCORE, step, output_dir)
-
-    loss = np.array(loss)
-    for k in summary_tensors:
-      summary_tensors[k] = np.array([np.asarray(t) for t in summary_tensors[k]])
-    loss = np.mean(loss, axis=0)
-    logging.info('step_i: %d, eval test split %s loss: %s', step, split, loss)
-    for key, values in metrics.items():
-      # `metric_utils.as_float` computes the average from a list of weighted
-      # scalars.
-      weighted_average = metric_utils.as_float(values)
-      sum_metric_weights = np.sum(np.stack([v[1] for v in values]))
-      logging.info('  %s=%f (weight=%f)', key, weighted_average,
-                   sum_metric_weights.item())
-    summary_utils.write_summary_entry(summary_writers[split], step, loss,
-                                      metrics, summary_tensors)
-    eval_metrics_list.append(metric_utils.as_float_dict(metrics))
-    eval_scoring_metrics_list.append(eval_scoring_metrics)
-    num_eval_steps.append(step_num)
-
-    _maybe_write_scoring_outputs(output_dir, step, flat_scoring_outputs)
+        eval_inputs = partitioner.preprocess_inputs(
+            model_inputs[split], eval_inputs, inputs_pspecs)
+        # TODO(bencaine): Rename eval_metrics here weighted scalars?
+        (
+            eval_loss,
+            eval_metrics,
+            per_example_output,
+            eval_summary_tensors,
+        ) = eval_steps[split](eval_inputs, unpadded_global_batch_size)
+
+        logging.info('Finished eval step on input batch %d for %s',
+                     step_num, model_inputs[split].hparams.name)
+
+        # Don't wait for the step outputs: the step is dispatched asynchronously
+        # and pulling them to host here would serialize the accelerator with
+        # Python. Their copy to host is started now and they are only
+        # materialized one step later, so that no more than two steps of
+        # outputs are on device at once. The streamed scoring outputs are
+        # written by the io thread instead.
+        if scoring_outputs_writer is not None:
+          per_example_output = py_utils.maybe_unreplicate_for_fully_replicated(
+              per_example_output)
+          _copy_to_host_async(per_example_output)
+          # Bounds the number of steps whose outputs are still on device.
+          while (len(scoring_write_futures) >=
+                 _MAX_PENDING_SCORING_OUTPUT_WRITES):
+            scoring_write_futures.popleft().result()
+          scoring_write_futures.append(
+              io_pool.submit(_write_scoring_outputs_batch,
+                             scoring_outputs_writer, per_example_output))
+          io_futures.append(scoring_write_futures[-1])
+        loss_sum = eval_loss if loss_sum is None else loss_sum + eval_loss
+        num_losses += 1
+        eval_summary_tensors = summary_utils.flatten_summary_dict(
+            eval_summary_tensors)
+        if summary_keys is None:
+          summary_keys = [k for k, _ in eval_summary_tensors]
+          summary_values = [[] for _ in summary_keys]
+          metric_keys = list(eval_metrics)
+          # The (value, weight) pairs of each metric are written into host
+          # arrays preallocated for the whole split.
+          metric_values = [
+              metric_utils.WeightedScalarBuffer(
+                  num_split_steps if num_split_steps > 0 else
+                  _EVAL_METRIC_BUFFER_CAPACITY) for _ in metric_keys
+          ]
+        assert len(eval_summary_tensors) == len(summary_keys)
+        step_outputs = py_utils.maybe_unreplicate_for_fully_replicated((
+            [v for _, v in eval_summary_tensors],
+            [eval_metrics[k] for k in metric_keys],
+            per_example_output if should_process_outputs else None,
+        ))
+        _copy_to_host_async(step_outputs)
+        if pending_step_outputs is not None:
+          _append_eval_step_outputs(pending_step_outputs, summary_values,
+                                    metric_values, per_example_scores)
+        pending_step_outputs = step_outputs
+
+      prefetcher.close()
+      logging.info('Finished eval on input %s',
+                   model_inputs[split].hparams.name)
+      if pending_step_outputs is not None:
+        _append_eval_step_outputs(pending_step_outputs, summary_values,
+                                  metric_values, per_example_scores)
+      summary_tensors = dict(zip(summary_keys or [], summary_values))
+      metrics = dict(zip(metric_keys or [], metric_values))
+      loss_sum = jax.device_get(
+          py_utils.maybe_unreplicate_for_fully_replicated(loss_sum))
+      # Flatten scoring outputs to simplify input for metrics eval computation.
+      flat_scoring_outputs = _flatten_scoring_outputs(per_example_scores)
+      del per_example_scores
+      eval_scoring_metrics = None
+      if should_process_outputs:
+        eval_scoring_metrics = seqio_input.process_outputs(
+            model_inputs[split], flat_scoring_outputs, summary_writers[split],
+            seqio_input.MetricType.SCORE, step, output_dir)
+
+      # The values are host arrays already, so each key takes a single stack.
+      summary_tensors = {k: np.stack(vs) for k, vs in summary_tensors.items()}
+      loss = loss_sum / num_losses if num_losses else np.float32(np.nan)
+      logging.info('step_i: %d, eval test split %s loss: %s', step, split, loss)
+      eval_metrics = {}
+      # The summaries get each metric already reduced, as a single
+      # (weighted average, sum of weights) pair.
+      summary_metrics = {}
+      for key, values in metrics.items():
+        weighted_average, sum_metric_weights = (
+            values.weighted_average_and_sum())
+        eval_metrics[key] = weighted_average
+        summary_metrics[key] = [(weighted_average, sum_metric_weights)]
+        logging.info('  %s=%f (weight=%f)', key, weighted_average,
+                     sum_metric_weights)
+      io_futures.append(
+          io_pool.submit(summary_utils.write_summary_entry,
+                         summary_writers[split], step, loss, summary_metrics,
+                         summary_tensors))
+      eval_metrics_list.append(eval_metrics)
+      eval_scoring_metrics_list.append(eval_scoring_metrics)
+      num_eval_steps.append(step_num)
+
+      if scoring_outputs_writer is not None:
+        logging.info('Wrote eval outputs to %s with %d entries', output_dir,
+                     scoring_outputs_writer.num_written)
+        io_futures.append(io_pool.submit(scoring_outputs_writer.close))
+      else:
+        io_futures.append(
+            io_pool.submit(_maybe_write_scoring_outputs, output_dir, step,
+                           flat_scoring_outputs))
+  finally:
+    # Stops the input thread and waits for the writes, even if the eval
+    # failed.
+    if prefetcher is not None:
+      prefetcher.close()
+    io_pool.shutdown(wait=True)
+  for future in io_futures:
+    future.result()  # Reraises any exception raised while writing.
 
   return (eval_metrics_list, eval_scoring_metrics_list, num_eval_steps)
 
@@ -948,9 +1349,12 @@ class _SpmdEvalRunner:
     step_i = int(
         py_utils.maybe_unreplicate_for_fully_replicated(
             partitioned_train_state.step))
+    # The eval state is shared by all the splits. Binding it doesn't affect
+    # the compilation caches of the partitioned step fns, which only key on
+    # the arguments' shapes and shardings.
+    eval_state = partitioned_train_state.to_eval_state()
     eval_step_fns = [
-        functools.partial(
-            step_fn, partitioned_train_state.to_eval_state(), eval_key)
+        functools.partial(step_fn, eval_state, eval_key)
         for step_fn in self._eval_steps
     ]
 
@@ -1188,16 +1592,78 @@ def decode(experiment_config: base_experiment.BaseExperiment,
   )
 
 
+def _compute_seqio_decode_metrics(
+    inp: base_input.BaseInput,
+    processed_decodes: Sequence[Tuple[str, Any]],
+    summary_writer: SummaryWriter,
+    step: int,
+    output_dir: epath.Path,
+    plain_text_output_fname: str) -> Dict[str, float]:
+  """Computes and summarizes the SeqIO decode metrics of a split."""
+  seqio_metric_values = seqio_input.process_outputs(
+      inp,
+      processed_decodes,
+      summary_writer,
+      seqio_input.MetricType.PREDICT,
+      step,
+      output_dir,
+      plain_text_output_fname=plain_text_output_fname)
+  summary_writer.flush()
+  return seqio_metric_values
+
+
+def _stack_summary_tensors(
+    summary_tensors: Dict[str, List[Any]]) -> Dict[str, np.ndarray]:
+  """Stacks the per-batch summary tensors of each key on host.
+
+  All the tensors are transferred to host at once, rather than one by one by
+  `np.array()`, and each key is then stacked into a single contiguous array.
+
+  Args:
+    summary_tensors: Mapping from summary key to its per-batch tensors.
+  """
+  summary_tensors = jax.device_get(dict(summary_tensors))
+  return {k: np.stack(tensors) for k, tensors in summary_tensors.items()}
+
+
+@contextlib.contextmanager
+def _gc_disabled():
+  """Disables the automatic garbage collection within a decode/infer loop.
+
+  The per-batch loops create many short-lived objects, which would otherwise
+  trigger collections in the middle of the steps. Instead, a single collection
+  runs once the loop is done.
+
+  Yields:
+    None.
+  """
+  if not gc.isenabled():
+    yield
+    return
+  gc.disable()
+  try:
+    yield
+  finally:
+    gc.collect()
+    gc.enable()
+
+
 def _merge_clu_metrics(metrics: Metrics, updated_metrics: Metrics) -> Metrics:
   """Merges existing eval metrics with updated metric data."""
   if metrics:
-    if set(metrics.keys()) != set(updated_metrics.keys()):
+    # Key views compare as sets, without building any.
+    if metrics.keys() != updated_metrics.keys():
       raise ValueError('metrics and updated_metrics keys don`t match. '
                        f'metrics keys: {metrics.keys()} '
                        f'updated_metrics keys: {updated_metrics.keys()}')
 
-    for key in metrics:
-      metrics[key] = metrics[key].merge(updated_metrics[key])
+    # Metrics are merged one by one rather than with a (jitted) tree_map: not
+    # all CLU metrics have a traceable merge (e.g. CollectingMetric), and the
+    # processed metrics are host values.
+    metrics = {
+        key: metric.merge(updated_metrics[key])
+        for key, metric in metrics.items()
+    }
   else:
     metrics = updated_metrics
   return metrics
@@ -1297,6 +1763,93 @@ def decode_pmap_model(
   )
 
 
+def _get_pmap_decode_step(
+    jax_task: tasks_lib.SingleTask,
+    task_p: tasks_lib.SingleTask.HParams,
+    var_weight_hparams: NestedWeightHParams,
+) -> Callable[..., Any]:
+  """Returns the pmapped decode step function.
+
+  The returned function is meant to be reused across checkpoints: `jax.pmap`
+  caches its compilations on the function, so the decode step is only traced
+  and compiled again if the input shapes change.
+
+  Args:
+    jax_task: instantiated model from task_p.
+    task_p: Params for the task encapsulating a data parallel model.
+    var_weight_hparams: Nested structure of HParams for the model weights.
+  """
+  model = jax_task.model
+  model_p = task_p.model
+  metrics_p = task_p.metrics
+  if not metrics_p:
+    metrics_p = base_metrics.MeanMetrics.HParams()
+  # Only used to aggregate the weighted scalars across replicas.
+  decode_metrics = instantiate(metrics_p)
+
+  def decode_step(mdl_states, prng_key, inputs, batch_idx):
+    if task_p.decode.prng_key_fold_with_batch_index:
+      prng_seed_decode = jax.random.fold_in(prng_key, batch_idx)
+    else:
+      prng_seed_decode = prng_key
+    mdl_states = mdl_states.to_eval_state()
+    (weighted_scalars, per_example_out,
+     updated_metrics), updated_vars = trainer_lib.decode_step(
+         model, mdl_states, prng_seed_decode, var_weight_hparams, inputs,
+         model_p.fprop_dtype, task_p.decode.prng_key_fold_with_global_step)
+
+    weighted_scalars = decode_metrics.aggregate(weighted_scalars)
+    aggregated_per_example_out = jax.lax.all_gather(
+        per_example_out, axis_name=PMAP_PARALLEL_AXIS_NAME, tiled=True)
+
+    summary_tensors = updated_vars.get(base_layer.SUMMARIES, {})
+    summary_tensors = summary_utils.flatten_flax_summaries(summary_tensors)
+    aggregated_summaries = summary_utils.aggregate_per_replica_summaries(
+        summary_tensors)
+
+    # We want to aggregate metrics across workers.
+    # In pmap we do an all gather of the metric state across workers, and then
+    # call reduce() on the metric which by default calls merge across workers.
+    # The metric states are gathered with a single all_gather call over the
+    # dict, which still lowers to one all-gather per leaf.
+    gathered_metrics = jax.lax.all_gather(
+        updated_metrics, axis_name=PMAP_PARALLEL_AXIS_NAME)
+    aggregated_metrics = {
+        metric_name: metric.reduce()
+        for metric_name, metric in gathered_metrics.items()
+    }
+
+    return (weighted_scalars, aggregated_per_example_out, aggregated_summaries,
+            aggregated_metrics)
+
+  # As an example, suppose the output leaf from trainer_lib.decoder_step()
+  # for each core has shape: [per_core_batch_size, decoding_length].
+  # In the all_gather we set tiled=True, so the output chunks are all
+  # concatenated into the existing batch axis, so we get shape
+  # [num_cores x per_core_batch_size, decoding_length].
+  # In the pmap call we set out_axes=None to not have to manually unreplicate,
+  # so the output of pmap_decode_step() will have the same shape.
+  #
+  # Example code snippet showing this:
+  #   # shape (8, 3, 2)
+  #   x = jnp.tile(jnp.arange(8)[:, None, None],[1, 3, 2])
+  #   # shape (24, 2)
+  #   z = jax.pmap(
+  #       lambda y: jax.lax.all_gather(y+1, axis_name='i', tiled=True),
+  #       axis_name='i', out_axes=None)(x)
+  #
+  # We aggregate all outputs from decode_step.
+  #
+  # The batch index is the same for all the replicas, so it is broadcast
+  # (in_axes=None) rather than passed as a per-device array.
+  pmap_decode_step = jax.pmap(
+      decode_step,
+      axis_name=PMAP_PARALLEL_AXIS_NAME,
+      in_axes=(0, 0, 0, None),
+      out_axes=(None, None, None, None))
+  return pmap_decode_step
+
+
 def partition_decode_once_pmap_model(
     jax_task: tasks_lib.SingleTask,
     partitioner: trainer_lib.Partitioner,
@@ -1311,6 +1864,9 @@ def partition_decode_once_pmap_model(
 ) -> Callable[
     [train_states.TrainState, List[SummaryWriter]], tuning_lib.DecodeMetrics
 ]:
+  # Built once, so that the decode step isn't recompiled for every checkpoint.
+  pmap_decode_step = _get_pmap_decode_step(jax_task, task_p, var_weight_hparams)
+
   def decode_once_fn(partitioned_train_state, summary_writers):
     with py_utils.timeit() as decode_period:
       (
@@ -1331,7 +1887,11 @@ def partition_decode_once_pmap_model(
           summary_writers,
           output_pickle,
           enable_checkpoint_saving=enable_checkpoint_saving,
+          pmap_decode_step=pmap_decode_step,
       )
+    # The tracked-metric checkpoints are written before training resumes, so
+    # that their errors are not lost.
+    _wait_for_tracked_checkpoint_saves()
     decode_steps_per_sec = sum(num_decode_steps) / decode_period.elapsed
     return tuning_lib.DecodeMetrics(
         input_p=input_p,
@@ -1356,6 +1916,7 @@ def decode_once_pmap_model(
     summary_writers: List[SummaryWriter],
     output_pickle: bool = True,
     enable_checkpoint_saving: bool = True,
+    pmap_decode_step: Optional[Callable[..., Any]] = None,
 ) -> Tuple[
     List[Optional[Dict[str, float]]],  # decode metrics.
     List[Optional[Dict[str, float]]],  # processed decode metrics.
@@ -1376,6 +1937,8 @@ def decode_once_pmap_model(
     replicated_model_states: A TrainState object.
     summary_writers: The summary writer objects to log summaries.
     enable_checkpoint_saving: Whether to perform checkpoint saving or not.
+    pmap_decode_step: The pmapped decode step, as returned by
+      `_get_pmap_decode_step()`. Built from the other arguments if None.
 
   Returns:
     A tuple of (a list of decode metrics,
@@ -1388,7 +1951,6 @@ def decode_once_pmap_model(
     return [], [], [], []
   work_unit = platform.work_unit()
   model = jax_task.model
-  model_p = task_p.model
   metrics_p = task_p.metrics
   if not metrics_p:
     metrics_p = base_metrics.MeanMetrics.HParams()
@@ -1399,217 +1961,234 @@ def decode_once_pmap_model(
 
   logging.info('step=%d', step_i)
 
-  def decode_step(mdl_states, prng_key, inputs, batch_idx):
-    if task_p.decode.prng_key_fold_with_batch_index:
-      prng_seed_decode = jax.random.fold_in(prng_key, batch_idx)
-    else:
-      prng_seed_decode = prng_key
-    mdl_states = mdl_states.to_eval_state()
-    (weighted_scalars, per_example_out,
-     updated_metrics), updated_vars = trainer_lib.decode_step(
-         model, mdl_states, prng_seed_decode, var_weight_hparams, inputs,
-         model_p.fprop_dtype, task_p.decode.prng_key_fold_with_global_step)
-
-    weighted_scalars = decode_metrics.aggregate(weighted_scalars)
-    aggregated_per_example_out = jax.lax.all_gather(
-        per_example_out, axis_name=PMAP_PARALLEL_AXIS_NAME, tiled=True)
-
-    summary_tensors = updated_vars.get(base_layer.SUMMARIES, {})
-    summary_tensors = summary_utils.flatten_flax_summaries(summary_tensors)
-    aggregated_summaries = summary_utils.aggregate_per_replica_summaries(
-        summary_tensors)
-
-    # We want to aggregate metrics across workers.
-    # In pmap we do an all gather of the metric state across workers, and then
-    # call reduce() on the metric which by default calls merge across workers.
-    aggregated_metrics = {}
-    for metric_name, metric in updated_metrics.items():
-      aggregated_metrics[metric_name] = jax.lax.all_gather(
-          metric, axis_name=PMAP_PARALLEL_AXIS_NAME).reduce()
-
-    return (weighted_scalars, aggregated_per_example_out, aggregated_summaries,
-            aggregated_metrics)
-
-  # As an example, suppose the output leaf from trainer_lib.decoder_step()
-  # for each core has shape: [per_core_batch_size, decoding_length].
-  # In the all_gather we set tiled=True, so the output chunks are all
-  # concatenated into the existing batch axis, so we get shape
-  # [num_cores x per_core_batch_size, decoding_length].
-  # In the pmap call we set out_axes=None to not have to manually unreplicate,
-  # so the output of pmap_decode_step() will have the same shape.
-  #
-  # Example code snippet showing this:
-  #   # shape (8, 3, 2)
-  #   x = jnp.tile(jnp.arange(8)[:, None, None],[1, 3, 2])
-  #   # shape (24, 2)
-  #   z = jax.pmap(
-  #       lambda y: jax.lax.all_gather(y+1, axis_name='i', tiled=True),
-  #       axis_name='i', out_axes=None)(x)
-  #
-  # We aggregate all outputs from decode_step.
-  pmap_decode_step = jax.pmap(
-      decode_step,
-      axis_name=PMAP_PARALLEL_AXIS_NAME,
-      out_axes=(None, None, None, None))
+  if pmap_decode_step is None:
+    pmap_decode_step = _get_pmap_decode_step(jax_task, task_p,
+                                             var_weight_hparams)
 
   def decode_step_func(inputs, batch_idx):
     # TODO(pax): shall we eval all sub-models during eval?
     return pmap_decode_step(replicated_model_states, prng_seed, inputs,
-                            batch_idx * jnp.ones((jax.local_device_count(),)))
+                            batch_idx)
 
   num_steps_per_input = [
       -1 if p.reset_for_eval else p.eval_loop_num_batches for p in input_p
   ]
   basedir = job_log_dir / f'{EvaluationMode.DECODE.value}_out'
   dirnames = _get_dir_names(input_p)
-  filename = _get_filename(
-      replicated_model_states.step, EvaluationMode.DECODE.value)
-  filenames = [basedir / s / filename for s in dirnames]
+  filename = _get_filename(step_i, EvaluationMode.DECODE.value)
+  output_dirs = [basedir / s for s in dirnames]
+  filenames = [d / filename for d in output_dirs]
+  # All the splits are probed at once, with a single leader broadcast.
+  can_load_written_outputs = _can_load_written_outputs_batch(
+      job_log_dir, [p.name for p in input_p], EvaluationMode.DECODE, step_i)
 
   decode_metrics_list = []
   processed_decode_metrics_list = []
   seqio_metrics_list = []
   num_decode_steps = []
-
-  for split, num_split_steps in enumerate(num_steps_per_input):
-    if _can_load_written_outputs(job_log_dir, input_p[split].name,
-                                 EvaluationMode.DECODE, step_i):
-      logging.info('Decoding on input %s at step %d already done, skipping.',
-                   input_p[split].name, step_i)
-      decode_metrics_list.append(None)
-      processed_decode_metrics_list.append(None)
-      seqio_metrics_list.append(None)
-      num_decode_steps.append(0)
-      continue
-    logging.info('Start decoding on input %s', input_p[split].name)
-    step_num = 0
-    # decode_metrics and process_decode_metrics work on WeightedScalars
-    # which are string -> (value, weight) pairs where value and weight
-    # scalars. These metrics are configured on the task.
-    decode_metrics = instantiate(metrics_p)
-    process_decode_metrics = instantiate(metrics_p)
-
-    # metrics and processed_metrics are dictionaries of
-    # strings -> clu_metrics.Metric objects. metrics is returned from decode()
-    # and processed_metrics is returned from process_decode_out.
-    metrics = {}
-    processed_metrics = {}
-    processed_decodes = []
-    all_summary_tensors = collections.defaultdict(list)
-    while num_split_steps < 0 or step_num < num_split_steps:
-      step_num += 1
-      try:
-        batch = inputs[split].get_next()
-      except (tf.errors.OutOfRangeError, StopIteration):
-        inputs[split].reset()
-        break
-      batch = partitioner.preprocess_inputs(inputs[split], batch, None)
-      (batch_metrics, out, summary_tensors,
-       updated_metrics) = decode_step_func(batch, batch_idx=step_num)
-      for key, tensor in summary_utils.flatten_summary_dict(summary_tensors):
-        all_summary_tensors[key].append(tensor)
-      # we store the metric directly as it has already been aggregated in
-      # side decode_step_fun
-      decode_metrics.store(batch_metrics)
-      logging.info('Finished decoding input batch %d for %s',
-                   step_num, input_p[split].name)
-
-      # Merge clu.metrics to update for each minibatch.
-      metrics = _merge_clu_metrics(metrics, updated_metrics)
-
-      # Run `process_decode_out` on CPU device as its implementation is not
-      # expected to be JIT friendly. Since we keep track of its outputs, we also
-      # don't want on-device allocation as would eventually lead to HBM OOM.
-      if jax.process_index() == 0:
-        with jax.default_device(jax.devices('cpu')[0]):
-          out = jax.tree_map(np.asarray, out)
-          process_decode_output = model.process_decode_out(inputs[split], out)
-
-        (processed_scalars, processed_out,
-         processed_metric_updates) = process_decode_output
-        processed_out = seqio_input.maybe_update_decode_output_keys(
-            processed_out, out)
-
-        process_decode_metrics.store(processed_scalars)
-        processed_decodes.extend(processed_out)
-        if processed_metric_updates:
-          processed_metrics = _merge_clu_metrics(processed_metrics,
-                                                 processed_metric_updates)
-
-        logging.info('Finished processing decoded input batch %d', step_num)
-
-      work_unit.set_task_status(
-          f'Finished decoding on {input_p[split].name} (batches={step_num})')
-      logging.info('Finished decoding on %s (batches=%s)',
-                   input_p[split].name, step_num)
-
-    # Now the decode loop of multiple batches on current dataset is done,
-    # we start to aggregate copmuted metrics and put them in summary.
-    seqio_metric_values = None
-    if seqio_input.should_process_outputs(inputs[split]):
-      logging.info('Finished processing all %d examples.',
-                   len(processed_decodes))
-      seqio_metric_values = seqio_input.process_outputs(
-          inputs[split],
-          processed_decodes,
-          summary_writers[split],
-          seqio_input.MetricType.PREDICT,
-          step_i,
-          basedir / dirnames[split],
-          plain_text_output_fname=f'{filenames[split]}.txt')
-
-    # Convert metrics to Dict[str, clu_values.Value] for summary writing.
-    metric_values = metric_utils.compute_metric_values(metrics)
-    process_metric_values = metric_utils.compute_metric_values(
-        processed_metrics)
-
-    with summary_writers[split].as_default():
-      logging.info('Summarizing of decode_metrics.')
-      decode_metric_dict = decode_metrics.summarize(step_i, 'decode_metrics')
-      logging.info('Summarizing of process_decode_metrics.')
-      processed_metric_dict = process_decode_metrics.summarize(
-          step_i, 'process_decode_metrics')
-      for key, tensor in all_summary_tensors.items():
-        summary_type = base_layer.get_summary_type_from_key(key)
-        summary_utils.write_summary_tensor(step_i, key, np.array(tensor),
-                                           summary_type)
-      metric_utils.write_clu_metric_summaries(metric_values, step_i)
-      metric_utils.write_clu_metric_summaries(process_metric_values, step_i)
-
-    if (jax.process_index() == 0 and
-        not flags.FLAGS.pax_only_aggregate_summaries):
-      dir_path = basedir / dirnames[split]
-      dir_path.mkdir(parents=True, exist_ok=True)
-      output_file = filenames[split]
-      logging.info('Writing decoder output to %s with %d entries', output_file,
-                   len(processed_decodes))
-      io_utils.write_key_value_pairs(
-          output_file, processed_decodes, output_pickle)
-
-    merged_decode_metrics = metric_utils.update_float_dict(
-        metric_utils.as_float_dict(decode_metric_dict),
-        metric_utils.as_float_dict(metric_values))
-    decode_metrics_list.append(merged_decode_metrics)
-
-    merged_processed_decode_metrics = metric_utils.update_float_dict(
-        metric_utils.as_float_dict(processed_metric_dict),
-        metric_utils.as_float_dict(process_metric_values))
-    processed_decode_metrics_list.append(merged_processed_decode_metrics)
-    seqio_metrics_list.append(seqio_metric_values)
-    num_decode_steps.append(step_num)
-
-    # Track metric specified by task_p.track_decoder_metric.
-    if task_p.track_decoder_metric:
-      _find_and_maybe_update_tracked_metric(
-          basedir,
-          split,
-          dirnames,
-          step_i,
-          input_p,
-          replicated_model_states,
-          task_p, [merged_decode_metrics, merged_processed_decode_metrics],
-          enable_checkpoint_saving=enable_checkpoint_saving)
-
+  # A single worker keeps the `process_decode_out` calls sequential, since
+  # models don't expect them to run concurrently.
+  process_decode_pool = concurrent.futures.ThreadPoolExecutor(
+      max_workers=1, thread_name_prefix='ProcessDecodeOut')
+  # The SeqIO metrics of a split are computed while the next ones are decoded.
+  seqio_metrics_pool = concurrent.futures.ThreadPoolExecutor(
+      max_workers=1, thread_name_prefix='SeqIOMetrics')
+
+  def start_prefetching(split):
+    # The next batches are read and resharded while the current one is decoded
+    # and post-processed.
+    return _InputPrefetcher(
+        functools.partial(_get_next_preprocessed, partitioner, inputs[split]),
+        num_steps_per_input[split], flags.FLAGS.pax_eval_input_prefetch_depth)
+
+  # The prefetchers started ahead of their split, by split index.
+  prefetchers = {}
+  prefetcher = None
+  try:
+    for split, num_split_steps in enumerate(num_steps_per_input):
+      if can_load_written_outputs[split]:
+        logging.info('Decoding on input %s at step %d already done, skipping.',
+                     input_p[split].name, step_i)
+        decode_metrics_list.append(None)
+        processed_decode_metrics_list.append(None)
+        seqio_metrics_list.append(None)
+        num_decode_steps.append(0)
+        continue
+      logging.info('Start decoding on input %s', input_p[split].name)
+      step_num = 0
+      # decode_metrics and process_decode_metrics work on WeightedScalars
+      # which are string -> (value, weight) pairs where value and weight
+      # scalars. These metrics are configured on the task.
+      decode_metrics = instantiate(metrics_p)
+      process_decode_metrics = instantiate(metrics_p)
+
+      # metrics and processed_metrics are dictionaries of
+      # strings -> clu_metrics.Metric objects. metrics is returned from decode()
+      # and processed_metrics is returned from process_decode_out.
+      metrics = {}
+      processed_metrics = {}
+      processed_decodes = []
+      num_processed_decodes = 0
+      process_decode_futures = collections.deque()
+      all_summary_tensors = collections.defaultdict(list)
+      # Computing the SeqIO metrics needs all the processed decodes at once.
+      # Otherwise, the leader passes them to its writer as they come.
+      should_process_outputs = seqio_input.should_process_outputs(inputs[split])
+      decodes_writer = None
+      if (not should_process_outputs and jax.process_index() == 0 and
+          not flags.FLAGS.pax_only_aggregate_summaries):
+        output_dirs[split].mkdir(parents=True, exist_ok=True)
+        decodes_writer = io_utils.KeyValuePairsWriter(
+            filenames[split], output_pickle,
+            downcast_floats=flags.FLAGS.pax_decode_output_float16)
+
+      def merge_processed_decodes(max_pending):
+        """Merges the post-processed batches in order, up to max_pending."""
+        nonlocal processed_metrics, num_processed_decodes
+        while len(process_decode_futures) > max_pending:
+          (processed_scalars, processed_out,
+           processed_metric_updates) = process_decode_futures.popleft().result()
+          process_decode_metrics.store(processed_scalars)
+          num_processed_decodes += len(processed_out)
+          if decodes_writer is not None:
+            decodes_writer.write(processed_out)
+          elif should_process_outputs:
+            processed_decodes.extend(processed_out)
+          if processed_metric_updates:
+            processed_metrics = _merge_clu_metrics(processed_metrics,
+                                                   processed_metric_updates)
+
+      prefetcher = prefetchers.pop(split, None) or start_prefetching(split)
+      with _gc_disabled():
+        while num_split_steps < 0 or step_num < num_split_steps:
+          step_num += 1
+          try:
+            batch = prefetcher.get_next()
+          except (tf.errors.OutOfRangeError, StopIteration):
+            prefetcher.close()
+            inputs[split].reset()
+            break
+          (batch_metrics, out, summary_tensors,
+           updated_metrics) = decode_step_func(batch, batch_idx=step_num)
+          for key, tensor in summary_utils.flatten_summary_dict(
+              summary_tensors):
+            all_summary_tensors[key].append(tensor)
+          # we store the metric directly as it has already been aggregated in
+          # side decode_step_fun
+          decode_metrics.store(batch_metrics)
+          logging.info('Finished decoding input batch %d for %s',
+                       step_num, input_p[split].name)
+
+          # Merge clu.metrics to update for each minibatch.
+          metrics = _merge_clu_metrics(metrics, updated_metrics)
+
+          # Run `process_decode_out` on CPU device as its implementation is not
+          # expected to be JIT friendly. Since we keep track of its outputs, we
+          # also don't want on-device allocation as would eventually lead to HBM
+          # OOM. It runs in the background while the next batches are decoded,
+          # and its results are merged in order.
+          if jax.process_index() == 0:
+            # Start copying the outputs to host without waiting for them: the
+            # worker blocks on the copy instead, while this loop moves on to the
+            # next batch.
+            _copy_to_host_async(out)
+            # Bounds the number of batches whose outputs are still on device.
+            merge_processed_decodes(_MAX_PENDING_PROCESS_DECODE_OUT - 1)
+            process_decode_futures.append(
+                process_decode_pool.submit(_process_decode_out, model,
+                                           inputs[split], out, step_num))
+
+          work_unit.set_task_status(
+              f'Finished decoding on {input_p[split].name} '
+              f'(batches={step_num})')
+          logging.info('Finished decoding on %s (batches=%s)',
+                       input_p[split].name, step_num)
+      prefetcher.close()
+      # Starts reading the next split's batches while this one's outputs are
+      # post-processed and written.
+      next_split = next((i for i in range(split + 1, len(input_p))
+                         if not can_load_written_outputs[i]), None)
+      if next_split is not None:
+        prefetchers[next_split] = start_prefetching(next_split)
+      merge_processed_decodes(0)
+
+      # Now the decode loop of multiple batches on current dataset is done,
+      # we start to aggregate copmuted metrics and put them in summary.
+      seqio_metric_values = None
+      if should_process_outputs:
+        logging.info('Finished processing all %d examples.',
+                     num_processed_decodes)
+        seqio_metric_values = seqio_metrics_pool.submit(
+            _compute_seqio_decode_metrics, inputs[split], processed_decodes,
+            summary_writers[split], step_i, output_dirs[split],
+            f'{filenames[split]}.txt')
+
+      # Convert metrics to Dict[str, clu_values.Value] for summary writing.
+      metric_values = metric_utils.compute_metric_values(metrics)
+      process_metric_values = metric_utils.compute_metric_values(
+          processed_metrics)
+
+      with summary_writers[split].as_default():
+        logging.info('Summarizing of decode_metrics.')
+        decode_metric_dict = decode_metrics.summarize(step_i, 'decode_metrics')
+        logging.info('Summarizing of process_decode_metrics.')
+        processed_metric_dict = process_decode_metrics.summarize(
+            step_i, 'process_decode_metrics')
+        for key, tensor in _stack_summary_tensors(all_summary_tensors).items():
+          summary_type = base_layer.get_summary_type_from_key(key)
+          summary_utils.write_summary_tensor(step_i, key, tensor, summary_type)
+        metric_utils.write_clu_metric_summaries(metric_values, step_i)
+        metric_utils.write_clu_metric_summaries(process_metric_values, step_i)
+      summary_writers[split].flush()
+
+      if decodes_writer is not None:
+        logging.info('Wrote decoder output to %s with %d entries',
+                     filenames[split], decodes_writer.num_written)
+        decodes_writer.close()
+      elif (jax.process_index() == 0 and
+            not flags.FLAGS.pax_only_aggregate_summaries):
+        output_dirs[split].mkdir(parents=True, exist_ok=True)
+        output_file = filenames[split]
+        logging.info('Writing decoder output to %s with %d entries',
+                     output_file, len(processed_decodes))
+        io_utils.write_key_value_pairs(
+            output_file, processed_decodes, output_pickle,
+            downcast_floats=flags.FLAGS.pax_decode_output_float16)
+
+      merged_decode_metrics = metric_utils.merged_as_float_dict(
+          decode_metric_dict, metric_values)
+      decode_metrics_list.append(merged_decode_metrics)
+
+      merged_processed_decode_metrics = metric_utils.merged_as_float_dict(
+          processed_metric_dict, process_metric_values)
+      processed_decode_metrics_list.append(merged_processed_decode_metrics)
+      seqio_metrics_list.append(seqio_metric_values)
+      num_decode_steps.append(step_num)
+
+      # Track metric specified by task_p.track_decoder_metric.
+      if task_p.track_decoder_metric:
+        _find_and_maybe_update_tracked_metric(
+            basedir,
+            split,
+            dirnames,
+            step_i,
+            input_p,
+            replicated_model_states,
+            task_p, [merged_decode_metrics, merged_processed_decode_metrics],
+            enable_checkpoint_saving=enable_checkpoint_saving)
+
+    seqio_metrics_list = [
+        v.result() if isinstance(v, concurrent.futures.Future) else v
+        for v in seqio_metrics_list
+    ]
+  finally:
+    # Stops the input threads and the workers, even if decoding failed.
+    if prefetcher is not None:
+      prefetcher.close()
+    for next_prefetcher in prefetchers.values():
+      next_prefetcher.close()
+    process_decode_pool.shutdown(wait=True)
+    seqio_metrics_pool.shutdown(wait=True)
   return (decode_metrics_list, processed_decode_metrics_list,
           seqio_metrics_list, num_decode_steps)
 
@@ -1821,188 +2400,261 @@ def decode_once_spmd_model(
       py_utils.maybe_unreplicate_for_fully_replicated(train_state.step))
   basedir = job_log_dir / f'{EvaluationMode.DECODE.value}_out'
   dirnames = _get_dir_names(input_p)
-  filenames = [
-      basedir / s / _get_filename(step_i, EvaluationMode.DECODE.value)
-      for s in dirnames
-  ]
-
-  logging.info('partitioned_train_state: %s',
-               jax.tree_map(lambda x: x.shape, train_state))
-  # We do not fold in jax.process_index in contrast to the pmap version and
-  # use a single global key instead to rely on pjit to split for different
-  # replicas.
-  logging.info('decode prng_key: %s', prng_key)
-  spmd_decode_step_fns = [
-      functools.partial(fn, train_state.to_eval_state(), prng_key)
-      for fn in decode_step_fns]
+  filename = _get_filename(step_i, EvaluationMode.DECODE.value)
+  output_dirs = [basedir / s for s in dirnames]
+  filenames = [d / filename for d in output_dirs]
+
+  # The shapes and the prng key are the same for every checkpoint, so they are
+  # only traversed, or read from device, and logged when verbose logging is on.
+  if logging.vlog_is_on(1):
+    logging.vlog(1, 'partitioned_train_state: %s',
+                 jax.tree_map(lambda x: x.shape, train_state))
+    # We do not fold in jax.process_index in contrast to the pmap version and
+    # use a single global key instead to rely on pjit to split for different
+    # replicas.
+    logging.vlog(1, 'decode prng_key: %s', prng_key)
 
   num_steps_per_input = [
       -1 if p.reset_for_eval else p.eval_loop_num_batches for p in input_p
   ]
+  # All the splits are probed at once, with a single leader broadcast.
+  can_load_written_outputs = _can_load_written_outputs_batch(
+      job_log_dir, [p.name for p in input_p], EvaluationMode.DECODE, step_i)
+  # Only the splits left to decode get a decode step fn, and the eval state
+  # shared by them is not even built when all the splits are already done.
+  spmd_decode_step_fns = [None] * len(decode_step_fns)
+  if not all(can_load_written_outputs):
+    eval_state = train_state.to_eval_state()
+    for split, fn in enumerate(decode_step_fns):
+      if not can_load_written_outputs[split]:
+        spmd_decode_step_fns[split] = functools.partial(fn, eval_state,
+                                                        prng_key)
   decode_metrics_list = []
   processed_decode_metrics_list = []
   seqio_metrics_list = []
   num_decode_steps = []
-
-  for split, num_split_steps in enumerate(num_steps_per_input):
-    if _can_load_written_outputs(job_log_dir, input_p[split].name,
-                                 EvaluationMode.DECODE, step_i):
-      logging.info('Decoding on input %s at step %d already done, skipping.',
-                   input_p[split].name, step_i)
-      decode_metrics_list.append(None)
-      processed_decode_metrics_list.append(None)
-      seqio_metrics_list.append(None)
-      num_decode_steps.append(0)
-      continue
-    logging.info('Start decoding on input %s', input_p[split].name)
-    step_num = 0
-    # decode_metrics and process_decode_metrics work on WeightedScalars
-    # which are string -> (value, weight) pairs where value and weight
-    # scalars. These metrics are configured on the task.
-    decode_metrics = instantiate(metrics_p)
-    process_decode_metrics = instantiate(metrics_p)
-
-    # metrics and processed_metrics are dictionaries of
-    # strings -> clu_metrics.Metric objects. metrics is returned from decode()
-    # and processed_metrics is returned from process_decode_out.
-    metrics = {}
-    processed_metrics = {}
-    processed_decodes = []
-    all_summary_tensors = collections.defaultdict(list)
-    while num_split_steps < 0 or step_num < num_split_steps:
-      step_num += 1
-      try:
-        batch = inputs[split].get_next_padded()
-      except (tf.errors.OutOfRangeError, StopIteration):
-        inputs[split].reset()
-        break
-      batch = partitioner.preprocess_inputs(
-          inputs[split], batch, inputs_partition_specs[split]
-      )
-      (weighted_scalars, out, updated_metrics), updated_vars = (
-          spmd_decode_step_fns[split](
-              batch, inputs[split].get_global_batch_size(inputs[split].hparams)
-          )
-      )
-
-      # Cross host synchronization happens at this point.
-      py_utils.sync_global_devices(f'spmd_decode_step_fn{split}_{step_num}')
-      # Output is fully replicated now, so it's ok to unreplicate it by
-      # retrieving from device 0 only.
-      out = py_utils.maybe_unreplicate_for_fully_replicated(out)
-      weighted_scalars = py_utils.maybe_unreplicate_for_fully_replicated(
-          weighted_scalars)
-
-      # Because outputs of the decode step in pjit are annotated to be on the
-      # GDA, they are already fully replicated across shards and we can just
-      # unreplicate.
-      # This also means we don't need to call an all_gather and a reduce()
-      # on each clu.metric like we do in pmap mode.
-      updated_metrics = py_utils.maybe_unreplicate_for_fully_replicated(
-          updated_metrics)
-
-      # Merge clu.metrics to update for each minibatch.
-      metrics = _merge_clu_metrics(metrics, updated_metrics)
-
-      summary_tensors = updated_vars.get(base_layer.SUMMARIES, {})
-      summary_tensors = summary_utils.flatten_flax_summaries(summary_tensors)
-      del updated_vars  # release GDA memory allocations
-
-      summary_tensors = py_utils.maybe_unreplicate_for_fully_replicated(
-          summary_tensors)
-      for key, tensor in summary_utils.flatten_summary_dict(summary_tensors):
-        all_summary_tensors[key].append(tensor)
-
-      logging.info('Finished decoding input batch %d for %s',
-                   step_num, input_p[split].name)
-      if jax.process_index() != 0:
+  # A single worker keeps the `process_decode_out` calls sequential, since
+  # models don't expect them to run concurrently.
+  process_decode_pool = concurrent.futures.ThreadPoolExecutor(
+      max_workers=1, thread_name_prefix='ProcessDecodeOut')
+  # The SeqIO metrics of a split are computed while the next ones are decoded.
+  seqio_metrics_pool = concurrent.futures.ThreadPoolExecutor(
+      max_workers=1, thread_name_prefix='SeqIOMetrics')
+
+  def start_prefetching(split):
+    # The next batches are read and sharded while the current one is decoded
+    # and post-processed.
+    return _InputPrefetcher(
+        functools.partial(_get_next_preprocessed, partitioner, inputs[split],
+                          inputs_partition_specs[split], padded=True),
+        num_steps_per_input[split], flags.FLAGS.pax_eval_input_prefetch_depth)
+
+  # The prefetchers started ahead of their split, by split index.
+  prefetchers = {}
+  prefetcher = None
+  try:
+    for split, num_split_steps in enumerate(num_steps_per_input):
+      if can_load_written_outputs[split]:
+        logging.info('Decoding on input %s at step %d already done, skipping.',
+                     input_p[split].name, step_i)
+        decode_metrics_list.append(None)
+        processed_decode_metrics_list.append(None)
+        seqio_metrics_list.append(None)
+        num_decode_steps.append(0)
         continue
-      weighted_scalars = jax.tree_map(np.array, weighted_scalars)
-      decode_metrics.store(weighted_scalars)
-
-      # Run `process_decode_out` on CPU device as its implementation is not
-      # expected to be JIT friendly. Since we keep track of its outputs, we also
-      # don't want on-device allocation as would eventually lead to HBM OOM.
-      with jax.default_device(jax.devices('cpu')[0]):
-        out = jax.tree_map(np.asarray, out)
-        process_decode_output = jax_task.model.process_decode_out(
-            inputs[split], out)
-
-      (process_weighted_scalars, processed,
-       processed_metric_updates) = process_decode_output
-      processed = seqio_input.maybe_update_decode_output_keys(processed, out)
-
-      process_decode_metrics.store(process_weighted_scalars)
-      processed_decodes.extend(processed)
-      if processed_metric_updates:
-        processed_metrics = _merge_clu_metrics(processed_metrics,
-                                               processed_metric_updates)
-
-      logging.info('Finished processing decoded input batch %d', step_num)
-
-    logging.info('Finished decoding on %s (batches=%s)',
-                 input_p[split].name, step_num)
-
-    # Now the decode loop of multiple batches on current dataset is done,
-    # we start to aggregate copmuted metrics and put them in summary.
-    seqio_metric_values = None
-    if seqio_input.should_process_outputs(inputs[split]):
-      logging.info('Finished processing all %d examples.',
-                   len(processed_decodes))
-      seqio_metric_values = seqio_input.process_outputs(
-          inputs[split],
-          processed_decodes,
-          summary_writers[split],
-          seqio_input.MetricType.PREDICT,
-          step_i,
-          basedir / dirnames[split],
-          plain_text_output_fname=f'{filenames[split]}.txt')
-
-    # Convert metrics to Dict[str, clu_values.Value] for summary writing.
-    metric_values = metric_utils.compute_metric_values(metrics)
-    process_metric_values = metric_utils.compute_metric_values(
-        processed_metrics)
-
-    with summary_writers[split].as_default():
-      logging.info('Summarizing of decode_metrics.')
-      decode_metric_dict = decode_metrics.summarize(step_i, 'decode_metrics')
-      logging.info('Summarizing of process_decode_metrics.')
-      processed_metric_dict = process_decode_metrics.summarize(
-          step_i, 'process_decode_metrics')
-      for key, tensor in all_summary_tensors.items():
-        summary_type = base_layer.get_summary_type_from_key(key)
-        summary_utils.write_summary_tensor(step_i, key, np.array(tensor),
-                                           summary_type)
-      metric_utils.write_clu_metric_summaries(metric_values, step_i)
-      metric_utils.write_clu_metric_summaries(process_metric_values, step_i)
-
-    if jax.process_index() == 0:
-      dir_path = basedir / dirnames[split]
-      dir_path.mkdir(parents=True, exist_ok=True)
-      output_file = filenames[split]
-      logging.info('Writing decoder output to %s with %d entries', output_file,
-                   len(processed_decodes))
-      io_utils.write_key_value_pairs(output_file, processed_decodes)
-
-    work_unit.set_task_status(f'Finished processing decoded input batch for '
-                              f'{input_p[split].name}')
-
-    decode_metrics_list.append(
-        metric_utils.update_float_dict(
-            metric_utils.as_float_dict(decode_metric_dict),
-            metric_utils.as_float_dict(metric_values)))
-    processed_decode_metrics_list.append(
-        metric_utils.update_float_dict(
-            metric_utils.as_float_dict(processed_metric_dict),
-            metric_utils.as_float_dict(process_metric_values)))
-    seqio_metrics_list.append(seqio_metric_values)
-    num_decode_steps.append(step_num)
-
-    # Track metric specified by task_p.track_decoder_metric.
-    if task_p.track_decoder_metric:
-      logging.warn('Decoder metric tracking is not implemented yet for pjit '
-                   'models. Ignoring metric tracking.')
+      logging.info('Start decoding on input %s', input_p[split].name)
+      step_num = 0
+      # decode_metrics and process_decode_metrics work on WeightedScalars
+      # which are string -> (value, weight) pairs where value and weight
+      # scalars. These metrics are configured on the task.
+      decode_metrics = instantiate(metrics_p)
+      process_decode_metrics = instantiate(metrics_p)
+
+      # metrics and processed_metrics are dictionaries of
+      # strings -> clu_metrics.Metric objects. metrics is returned from decode()
+      # and processed_metrics is returned from process_decode_out.
+      metrics = {}
+      processed_metrics = {}
+      processed_decodes = []
+      num_processed_decodes = 0
+      process_decode_futures = collections.deque()
+      all_summary_tensors = collections.defaultdict(list)
+      # Computing the SeqIO metrics needs all the processed decodes at once.
+      # Otherwise, the leader passes them to its writer as they come.
+      should_process_outputs = seqio_input.should_process_outputs(inputs[split])
+      decodes_writer = None
+      if not should_process_outputs and jax.process_index() == 0:
+        output_dirs[split].mkdir(parents=True, exist_ok=True)
+        decodes_writer = io_utils.KeyValuePairsWriter(
+            filenames[split],
+            downcast_floats=flags.FLAGS.pax_decode_output_float16)
+
+      def merge_processed_decodes(max_pending):
+        """Merges the post-processed batches in order, up to max_pending."""
+        nonlocal processed_metrics, num_processed_decodes
+        while len(process_decode_futures) > max_pending:
+          (processed_scalars, processed_out,
+           processed_metric_updates) = process_decode_futures.popleft().result()
+          process_decode_metrics.store(processed_scalars)
+          num_processed_decodes += len(processed_out)
+          if decodes_writer is not None:
+            decodes_writer.write(processed_out)
+          else:
+            processed_decodes.extend(processed_out)
+          if processed_metric_updates:
+            processed_metrics = _merge_clu_metrics(processed_metrics,
+                                                   processed_metric_updates)
+
+      prefetcher = prefetchers.pop(split, None) or start_prefetching(split)
+      with _gc_disabled():
+        while num_split_steps < 0 or step_num < num_split_steps:
+          step_num += 1
+          try:
+            batch = prefetcher.get_next()
+          except (tf.errors.OutOfRangeError, StopIteration):
+            prefetcher.close()
+            inputs[split].reset()
+            break
+          (weighted_scalars, out, updated_metrics), updated_vars = (
+              spmd_decode_step_fns[split](
+                  batch,
+                  inputs[split].get_global_batch_size(inputs[split].hparams),
+              )
+          )
 
+          # Because outputs of the decode step in pjit are annotated to be on
+          # the GDA, they are already fully replicated across shards and we can
+          # just unreplicate.
+          # This also means we don't need to call an all_gather and a reduce()
+          # on each clu.metric like we do in pmap mode.
+          summary_tensors = updated_vars.get(base_layer.SUMMARIES, {})
+          summary_tensors = summary_utils.flatten_flax_summaries(
+              summary_tensors)
+          del updated_vars  # release GDA memory allocations
+          # Both trees are unreplicated in a single walk.
+          updated_metrics, summary_tensors = (
+              py_utils.maybe_unreplicate_for_fully_replicated(
+                  (updated_metrics, summary_tensors)))
+
+          # Merge clu.metrics to update for each minibatch.
+          metrics = _merge_clu_metrics(metrics, updated_metrics)
+
+          for key, tensor in summary_utils.flatten_summary_dict(
+              summary_tensors):
+            all_summary_tensors[key].append(tensor)
+
+          logging.info('Finished decoding input batch %d for %s',
+                       step_num, input_p[split].name)
+          if jax.process_index() != 0:
+            continue
+          # Output is fully replicated, so it's ok to unreplicate it by
+          # retrieving from device 0 only. Only the leader ever transfers it to
+          # host.
+          out, weighted_scalars = (
+              py_utils.maybe_unreplicate_for_fully_replicated(
+                  (out, weighted_scalars)))
+          weighted_scalars = jax.tree_map(np.array, weighted_scalars)
+          decode_metrics.store(weighted_scalars)
+
+          # Run `process_decode_out` on CPU device as its implementation is not
+          # expected to be JIT friendly. Since we keep track of its outputs, we
+          # also don't want on-device allocation as would eventually lead to HBM
+          # OOM. It runs in the background while the next batches are decoded,
+          # and its results are merged in order.
+          # Start copying the outputs to host without waiting for them: the
+          # worker blocks on the copy instead, while this loop moves on to the
+          # next batch.
+          _copy_to_host_async(out)
+          # Bounds the number of batches whose outputs are still on device.
+          merge_processed_decodes(_MAX_PENDING_PROCESS_DECODE_OUT - 1)
+          process_decode_futures.append(
+              process_decode_pool.submit(_process_decode_out, jax_task.model,
+                                         inputs[split], out, step_num))
+
+      prefetcher.close()
+      # Starts reading the next split's batches while this one's outputs are
+      # post-processed and written.
+      next_split = next((i for i in range(split + 1, len(input_p))
+                         if not can_load_written_outputs[i]), None)
+      if next_split is not None:
+        prefetchers[next_split] = start_prefetching(next_split)
+      merge_processed_decodes(0)
+      logging.info('Finished decoding on %s (batches=%s)',
+                   input_p[split].name, step_num)
+      # The hosts are only synchronized once the whole split is decoded rather
+      # than after every decode step.
+      py_utils.sync_global_devices(f'spmd_decode_split_{split}_done')
+
+      # Now the decode loop of multiple batches on current dataset is done,
+      # we start to aggregate copmuted metrics and put them in summary.
+      seqio_metric_values = None
+      if should_process_outputs:
+        logging.info('Finished processing all %d examples.',
+                     num_processed_decodes)
+        seqio_metric_values = seqio_metrics_pool.submit(
+            _compute_seqio_decode_metrics, inputs[split], processed_decodes,
+            summary_writers[split], step_i, output_dirs[split],
+            f'{filenames[split]}.txt')
+
+      # Convert metrics to Dict[str, clu_values.Value] for summary writing.
+      metric_values = metric_utils.compute_metric_values(metrics)
+      process_metric_values = metric_utils.compute_metric_values(
+          processed_metrics)
+
+      with summary_writers[split].as_default():
+        logging.info('Summarizing of decode_metrics.')
+        decode_metric_dict = decode_metrics.summarize(step_i, 'decode_metrics')
+        logging.info('Summarizing of process_decode_metrics.')
+        processed_metric_dict = process_decode_metrics.summarize(
+            step_i, 'process_decode_metrics')
+        for key, tensor in _stack_summary_tensors(all_summary_tensors).items():
+          summary_type = base_layer.get_summary_type_from_key(key)
+          summary_utils.write_summary_tensor(step_i, key, tensor, summary_type)
+        metric_utils.write_clu_metric_summaries(metric_values, step_i)
+        metric_utils.write_clu_metric_summaries(process_metric_values, step_i)
+      summary_writers[split].flush()
+
+      if decodes_writer is not None:
+        logging.info('Wrote decoder output to %s with %d entries',
+                     filenames[split], decodes_writer.num_written)
+        decodes_writer.close()
+      elif jax.process_index() == 0:
+        output_dirs[split].mkdir(parents=True, exist_ok=True)
+        output_file = filenames[split]
+        logging.info('Writing decoder output to %s with %d entries',
+                     output_file, len(processed_decodes))
+        io_utils.write_key_value_pairs(
+            output_file, processed_decodes,
+            downcast_floats=flags.FLAGS.pax_decode_output_float16)
+
+      work_unit.set_task_status(f'Finished processing decoded input batch for '
+                                f'{input_p[split].name}')
+
+      decode_metrics_list.append(
+          metric_utils.merged_as_float_dict(decode_metric_dict, metric_values))
+      processed_decode_metrics_list.append(
+          metric_utils.merged_as_float_dict(processed_metric_dict,
+                                            process_metric_values))
+      seqio_metrics_list.append(seqio_metric_values)
+      num_decode_steps.append(step_num)
+
+      # Track metric specified by task_p.track_decoder_metric.
+      if task_p.track_decoder_metric:
+        logging.warn('Decoder metric tracking is not implemented yet for pjit '
+                     'models. Ignoring metric tracking.')
+
+    seqio_metrics_list = [
+        v.result() if isinstance(v, concurrent.futures.Future) else v
+        for v in seqio_metrics_list
+    ]
+  finally:
+    # Stops the input threads and the workers, even if decoding failed.
+    if prefetcher is not None:
+      prefetcher.close()
+    for next_prefetcher in prefetchers.values():
+      next_prefetcher.close()
+    process_decode_pool.shutdown(wait=True)
+    seqio_metrics_pool.shutdown(wait=True)
   return (decode_metrics_list, processed_decode_metrics_list,
           seqio_metrics_list, num_decode_steps)
 
@@ -2034,11 +2686,15 @@ def _common_eval_or_decode_loop(
   with contextlib.ExitStack() as exit_stack:
     if input_p:
       summary_writers = [
-          exit_stack.enter_context(summary_utils.get_summary_writer(d))
+          exit_stack.enter_context(
+              summary_utils.get_summary_writer(
+                  d, max_queue=_SUMMARY_WRITER_MAX_QUEUE))
           for d in summary_decode_dirs
       ]
     eval_summary_writers = [
-        exit_stack.enter_context(summary_utils.get_summary_writer(d))
+        exit_stack.enter_context(
+            summary_utils.get_summary_writer(
+                d, max_queue=_SUMMARY_WRITER_MAX_QUEUE))
         for d in summary_eval_dirs
     ]
 
@@ -2080,6 +2736,7 @@ def _common_eval_or_decode_loop(
         if is_last_ckpt:
           break
       # Release partitioned_train_state.
+      _wait_for_tracked_checkpoint_saves()
       jax.tree_util.tree_map(lambda x: x.delete(), partitioned_train_state)
       del partitioned_train_state
       new_checkpoint_step = checkpointer.wait_for_new_step(last_checkpoint_step)
@@ -2087,9 +2744,57 @@ def _common_eval_or_decode_loop(
           new_checkpoint_step, train_state_metadata
       )
       last_checkpoint_step = new_checkpoint_step
+    _wait_for_tracked_checkpoint_saves()
     gc.unfreeze()
 
 
+# Single background thread writing the tracked-metric checkpoints, so that the
+# decode loop does not block on them. Created on first use.
+_tracked_checkpoint_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_tracked_checkpoint_futures: List[concurrent.futures.Future] = []
+
+
+# The decoder metric trackers by (directory, metric, data partition), so that
+# their status file is only read the first time they are used in a job.
+_metric_trackers: Dict[Tuple[epath.Path, str, str],
+                       trk_utils.MetricTracker] = {}
+
+
+def _save_tracked_checkpoint(host_model_states: train_states.TrainState,
+                             tracker_dir_path: epath.Path,
+                             tracker: trk_utils.MetricTracker,
+                             m_value: float, step: int) -> None:
+  """Saves a tracked-metric checkpoint, then records it in the tracker."""
+  checkpoints.save_checkpoint(host_model_states, tracker_dir_path)
+  # The status file only points to the new best checkpoint once it's written.
+  tracker.update(value=m_value, global_step=step)
+
+
+def _save_tracked_checkpoint_async(
+    unreplicated_model_states: train_states.TrainState,
+    tracker_dir_path: epath.Path, tracker: trk_utils.MetricTracker,
+    m_value: float, step: int) -> None:
+  """Saves a tracked-metric checkpoint in a background thread."""
+  global _tracked_checkpoint_pool
+  if _tracked_checkpoint_pool is None:
+    _tracked_checkpoint_pool = concurrent.futures.ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix='tracked_checkpoint')
+  # The states are copied to host first: the device buffers may be shared
+  # with a train state that the next train step donates.
+  _copy_to_host_async(unreplicated_model_states)
+  host_model_states = jax.device_get(unreplicated_model_states)
+  _tracked_checkpoint_futures.append(
+      _tracked_checkpoint_pool.submit(_save_tracked_checkpoint,
+                                      host_model_states, tracker_dir_path,
+                                      tracker, m_value, step))
+
+
+def _wait_for_tracked_checkpoint_saves() -> None:
+  """Blocks until the pending tracked-metric checkpoints are written."""
+  while _tracked_checkpoint_futures:
+    _tracked_checkpoint_futures.pop(0).result()
+
+
 def _maybe_update_tracked_metric(
     m_value: float,
     step: int,
@@ -2118,21 +2823,25 @@ def _maybe_update_tracked_metric(
     enable_checkpoint_saving: Whether to perform checkpoint saving or not.
   """
   if jax.process_index() == 0:
-    tracker_dir_path.mkdir(parents=True, exist_ok=True)
-    initial_value = sys.float_info.max
+    # The trackers are only updated once their pending checkpoints are saved,
+    # which also reraises any error of these saves.
+    _wait_for_tracked_checkpoint_saves()
+    # With sign = -1, a max tracker is handled as a min tracker of -m_value.
+    sign = 1.0
     if min_or_max == tasks_lib.SingleTask.TrackDecoderMetricMode.MAX:
-      initial_value = -sys.float_info.max
-    tracker = trk_utils.MetricTracker(
-        dir_name=tracker_dir_path,
-        metric_name=tracked_metric,
-        metric_partition=data_partition_name,
-        initial_metric_value=initial_value)
-    if ((min_or_max == tasks_lib.SingleTask.TrackDecoderMetricMode.MIN and
-         m_value < tracker.metric_value) or
-        (min_or_max == tasks_lib.SingleTask.TrackDecoderMetricMode.MAX and
-         m_value > tracker.metric_value)):
+      sign = -1.0
+    tracker_key = (tracker_dir_path, tracked_metric, data_partition_name)
+    tracker = _metric_trackers.get(tracker_key)
+    if tracker is None:
+      tracker_dir_path.mkdir(parents=True, exist_ok=True)
+      tracker = trk_utils.MetricTracker(
+          dir_name=tracker_dir_path,
+          metric_name=tracked_metric,
+          metric_partition=data_partition_name,
+          initial_metric_value=sign * sys.float_info.max)
+      _metric_trackers[tracker_key] = tracker
+    if sign * m_value < sign * tracker.metric_value:
       logging.info('Updating tracked %s value and checkpoint.', tracked_metric)
-      tracker.update(value=m_value, global_step=step)
       # Also save checkpoint; we just need to save the first model replica.
       # WARNING: the checkpoint saved here will not contain optimizer state
       # if it is written by a separate decoding job; if decoding is done
@@ -2142,12 +2851,17 @@ def _maybe_update_tracked_metric(
       # than those obtained during training if the model state cannot be
       # fully recovered due to the missing optimizer state, e.g. when using
       # EMA during training and separate decoding jobs.
-      # TODO(ciprianchelba): specify the checkpoint format and/or async
-      # checkpointing.
+      # The checkpoint is written in a background thread, and the tracker is
+      # updated once it is.
+      # TODO(ciprianchelba): specify the checkpoint format.
       if enable_checkpoint_saving:
         unreplicated_model_states = jax.tree_map(lambda x: x[0],
                                                  replicated_model_states)
-        checkpoints.save_checkpoint(unreplicated_model_states, tracker_dir_path)
+        _save_tracked_checkpoint_async(unreplicated_model_states,
+                                       tracker_dir_path, tracker, m_value,
+                                       step)
+      else:
+        tracker.update(value=m_value, global_step=step)
 
 
 def _find_and_maybe_update_tracked_metric(
@@ -2323,27 +3037,28 @@ def infer_and_write_pmap(
           output_format=infer_writer_p.output_format)
 
     step = 0
-    while num_steps < 0 or step < num_steps:
-      step += 1
-      logging.info('processing input batch %d', step)
-      try:
-        batch = input_gen.get_next()
-      except (tf.errors.OutOfRangeError, StopIteration):
-        input_gen.reset()
-        break
+    with _gc_disabled():
+      while num_steps < 0 or step < num_steps:
+        step += 1
+        logging.info('processing input batch %d', step)
+        try:
+          batch = input_gen.get_next()
+        except (tf.errors.OutOfRangeError, StopIteration):
+          input_gen.reset()
+          break
 
-      pmap_batch = partitioner.preprocess_inputs(input_gen, batch, None)
-      outputs = infer_pmap_step(replicated_model_states, output_seeds,
-                                pmap_batch)
-      # Get first device's output since it's been replicated by all-gather
-      outputs = py_utils.maybe_unreplicate_for_fully_replicated(outputs)
-      outputs_cpu = jax.tree_map(np.asarray, outputs)
-
-      if jax.process_index() == 0:
-        serialized_outputs = task.inference_runner.serialize_outputs(
-            outputs_cpu)
-        # fire-and-forget writing
-        writer.write(serialized_outputs)
+        pmap_batch = partitioner.preprocess_inputs(input_gen, batch, None)
+        outputs = infer_pmap_step(replicated_model_states, output_seeds,
+                                  pmap_batch)
+        # Get first device's output since it's been replicated by all-gather
+        outputs = py_utils.maybe_unreplicate_for_fully_replicated(outputs)
+        outputs_cpu = jax.tree_map(np.asarray, outputs)
+
+        if jax.process_index() == 0:
+          serialized_outputs = task.inference_runner.serialize_outputs(
+              outputs_cpu)
+          # fire-and-forget writing
+          writer.write(serialized_outputs)
 
     if jax.process_index() == 0:
       writer.close()
@@ -0,0 +1,320 @@
+# coding=utf-8
+# Copyright 2022 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for eval_lib."""
+
+import re
+import threading
+import time
+from unittest import mock
+
+from absl import flags
+from absl.testing import absltest
+from etils import epath
+import jax
+import numpy as np
+import optax
+from paxml import checkpoints
+from paxml import eval_lib
+from paxml import train_states
+from praxis import py_utils
+
+FLAGS = flags.FLAGS
+NestedMap = py_utils.NestedMap
+
+
+class _TestEvalCheckpointer(eval_lib._EvalCheckpointer):
+
+  def load_checkpoint_for_step(self, step, train_state_metadata):
+    raise NotImplementedError
+
+
+def _make_checkpointer(
+    restore_checkpoint_dir: epath.Path) -> _TestEvalCheckpointer:
+  with mock.patch.object(eval_lib, 'has_ema', return_value=False):
+    return _TestEvalCheckpointer(
+        jax_task=mock.Mock(),
+        job_log_dir=epath.Path(FLAGS.test_tmpdir),
+        checkpoint_type=checkpoints.CheckpointType.FLAX,
+        restore_checkpoint_dir=restore_checkpoint_dir,
+        restore_checkpoint_step=None,
+        partitioner=mock.Mock())
+
+
+class EvalCheckpointerTest(absltest.TestCase):
+
+  @mock.patch.object(time, 'sleep')
+  def test_wait_for_step_backs_off_unchanged_dir(self, mock_sleep):
+    checkpoint_dir = epath.Path(FLAGS.test_tmpdir) / 'unchanged_checkpoint_dir'
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    checkpointer = _make_checkpointer(checkpoint_dir)
+    steps = iter([None, None, 100])
+    with mock.patch.object(
+        checkpointer, 'retrieve_latest_checkpoint_step',
+        side_effect=lambda: next(steps)) as mock_retrieve:
+      step = checkpointer.wait_for_step(
+          lambda s: s is not None, min_sleep_secs=1, max_sleep_secs=4)
+
+    self.assertEqual(step, 100)
+    # The step is read on the first poll, then only once the backoff is
+    # capped, since the directory mtime never changes.
+    self.assertEqual(mock_retrieve.call_count, 3)
+    self.assertEqual([c.args[0] for c in mock_sleep.call_args_list],
+                     [1, 1.5, 2.25, 3.375, 4])
+
+  @mock.patch.object(time, 'sleep')
+  def test_wait_for_step_reads_every_poll_without_dir_mtime(self, mock_sleep):
+    checkpointer = _make_checkpointer(
+        epath.Path(FLAGS.test_tmpdir) / 'missing_checkpoint_dir')
+    steps = iter([None, None, None, 100])
+    with mock.patch.object(
+        checkpointer, 'retrieve_latest_checkpoint_step',
+        side_effect=lambda: next(steps)) as mock_retrieve:
+      step = checkpointer.wait_for_step(
+          lambda s: s is not None, min_sleep_secs=1, max_sleep_secs=4)
+
+    self.assertEqual(step, 100)
+    # Without a directory mtime, the step is read on every poll, while the
+    # sleep between polls still backs off.
+    self.assertEqual(mock_retrieve.call_count, 4)
+    self.assertEqual([c.args[0] for c in mock_sleep.call_args_list],
+                     [1, 1.5, 2.25])
+
+  @mock.patch.object(time, 'sleep')
+  def test_wait_for_step_returns_ready_step(self, mock_sleep):
+    checkpoint_dir = epath.Path(FLAGS.test_tmpdir) / 'checkpoint_dir'
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    checkpointer = _make_checkpointer(checkpoint_dir)
+    with mock.patch.object(
+        checkpointer, 'retrieve_latest_checkpoint_step', return_value=200):
+      step = checkpointer.wait_for_step(
+          lambda s: s == 200, min_sleep_secs=1, max_sleep_secs=4)
+
+    self.assertEqual(step, 200)
+    mock_sleep.assert_not_called()
+
+
+def _reference_extract_ema(
+    model_states: train_states.TrainState) -> train_states.TrainState:
+  """The per-leaf `tree_map` implementation that `extract_ema` replaced."""
+  if len(model_states.opt_states) != 1:
+    raise ValueError('EMA currently only supports a single learner (got '
+                     f'`{len(model_states.opt_states)}`).')
+  if eval_lib.NO_PREFIX_KEY not in model_states.opt_states[0]:
+    for v in model_states.opt_states[0]:
+      if isinstance(v, dict) and 'ema' in v:
+        return train_states.TrainState(
+            step=model_states.step, mdl_vars=v.ema, opt_states={})
+  else:
+    ret = None
+    for item in model_states.opt_states[0].values():
+      if isinstance(item, tuple):
+        for v in item:
+          if isinstance(v, dict) and 'ema' in v:
+            if ret is None:
+              ret = v.ema
+            else:
+              ret = jax.tree_map(
+                  lambda x, y: y if py_utils.is_optax_masked_node(x) else x,
+                  ret,
+                  v.ema,
+                  is_leaf=py_utils.is_optax_masked_node)
+    if ret is not None:
+      return train_states.TrainState(
+          step=model_states.step, mdl_vars=ret, opt_states={})
+  raise ValueError('Could not find EMA states in `%r`.' %
+                   model_states.opt_states)
+
+
+def _count():
+  return np.zeros([], dtype=np.int32)
+
+
+def _vectorized_states(*stages) -> train_states.TrainState:
+  """Returns the train states of a vectorized model with the given stages."""
+  opt_states = {eval_lib.NO_PREFIX_KEY: stages[0]}
+  for i, stage in enumerate(stages[1:]):
+    opt_states[f'p#{len(stages) - 1}#i{i}'] = stage
+  return train_states.TrainState(
+      step=np.array(10), mdl_vars=NestedMap(), opt_states=[opt_states])
+
+
+def _ema_stage(ema: NestedMap):
+  return (NestedMap(count=_count()), NestedMap(count=_count(), ema=ema))
+
+
+class ExtractEmaTest(absltest.TestCase):
+
+  def assert_same_extract_ema(self, model_states):
+    try:
+      expected = _reference_extract_ema(model_states)
+    except ValueError as e:
+      with self.assertRaisesRegex(ValueError, re.escape(str(e))):
+        eval_lib.extract_ema(model_states)
+      return
+    ema_states = eval_lib.extract_ema(model_states)
+    self.assertEqual(
+        jax.tree_util.tree_structure(
+            expected.mdl_vars, is_leaf=py_utils.is_optax_masked_node),
+        jax.tree_util.tree_structure(
+            ema_states.mdl_vars, is_leaf=py_utils.is_optax_masked_node))
+    jax.tree_map(np.testing.assert_array_equal, expected.mdl_vars,
+                 ema_states.mdl_vars)
+    self.assertEqual(ema_states.opt_states, {})
+
+  def test_vectorized_disjoint_masked_leaves(self):
+    w0 = np.arange(4, dtype=np.float32)
+    w1 = np.ones([2, 2], dtype=np.float32)
+    w2 = np.full([3], 2., dtype=np.float32)
+    masked = optax.MaskedNode
+    model_states = _vectorized_states(
+        _ema_stage(NestedMap(params=NestedMap(
+            a=NestedMap(w=w0, b=masked()), c=NestedMap(w=masked())))),
+        _ema_stage(NestedMap(params=NestedMap(
+            a=NestedMap(w=masked(), b=w1), c=NestedMap(w=masked())))),
+        _ema_stage(NestedMap(params=NestedMap(
+            a=NestedMap(w=masked(), b=masked()), c=NestedMap(w=w2)))),
+    )
+    self.assert_same_extract_ema(model_states)
+    ema = eval_lib.extract_ema(model_states).mdl_vars
+    np.testing.assert_array_equal(ema.params.a.w, w0)
+    np.testing.assert_array_equal(ema.params.a.b, w1)
+    np.testing.assert_array_equal(ema.params.c.w, w2)
+
+  def test_vectorized_masked_subtree(self):
+    w0 = np.arange(4, dtype=np.float32)
+    w1 = np.ones([2, 2], dtype=np.float32)
+    model_states = _vectorized_states(
+        _ema_stage(NestedMap(
+            params=NestedMap(a=w0, b=optax.MaskedNode()))),
+        _ema_stage(NestedMap(params=NestedMap(
+            a=optax.MaskedNode(), b=NestedMap(w=w1, v=w1)))),
+    )
+    self.assert_same_extract_ema(model_states)
+
+  def test_vectorized_ema_in_nested_chain(self):
+    w0 = np.arange(4, dtype=np.float32)
+    w1 = np.ones([2, 2], dtype=np.float32)
+    nested_chain = (
+        NestedMap(count=_count()),
+        (NestedMap(count=_count()),
+         NestedMap(count=_count(), ema=NestedMap(
+             params=NestedMap(a=optax.MaskedNode(), b=w1)))),
+    )
+    model_states = _vectorized_states(
+        _ema_stage(NestedMap(params=NestedMap(a=w0, b=optax.MaskedNode()))),
+        nested_chain)
+    self.assert_same_extract_ema(model_states)
+
+  def test_ema_in_nested_chain(self):
+    model_states = train_states.TrainState(
+        step=np.array(10), mdl_vars=NestedMap(), opt_states=[(
+            NestedMap(count=_count()),
+            (NestedMap(count=_count(),
+                       ema=NestedMap(params=NestedMap(w=np.ones([2])))),),
+        )])
+    self.assert_same_extract_ema(model_states)
+
+  def test_not_vectorized(self):
+    model_states = train_states.TrainState(
+        step=np.array(10), mdl_vars=NestedMap(), opt_states=[(
+            NestedMap(count=_count()),
+            NestedMap(count=_count(),
+                      ema=NestedMap(params=NestedMap(w=np.ones([2])))),
+        )])
+    self.assert_same_extract_ema(model_states)
+
+  def test_no_ema(self):
+    model_states = _vectorized_states(
+        (NestedMap(count=_count()),),
+        (NestedMap(count=_count()),),
+    )
+    self.assert_same_extract_ema(model_states)
+    with self.assertRaisesRegex(ValueError, 'Could not find EMA states'):
+      eval_lib.extract_ema(model_states)
+
+
+def _prefetcher_threads():
+  return [
+      t for t in threading.enumerate()
+      if t.name.startswith('EvalInputPrefetcher')
+  ]
+
+
+class InputPrefetcherTest(absltest.TestCase):
+
+  def test_get_next_in_order(self):
+    batches = iter(range(5))
+    prefetcher = eval_lib._InputPrefetcher(
+        lambda: next(batches), num_batches=5, depth=2)
+    try:
+      self.assertEqual([prefetcher.get_next() for _ in range(5)],
+                       list(range(5)))
+    finally:
+      prefetcher.close()
+
+  def test_stops_at_num_batches(self):
+    num_calls = 0
+
+    def get_next():
+      nonlocal num_calls
+      num_calls += 1
+      return num_calls
+
+    prefetcher = eval_lib._InputPrefetcher(get_next, num_batches=3, depth=2)
+    self.assertEqual([prefetcher.get_next() for _ in range(3)], [1, 2, 3])
+    prefetcher.close()
+    self.assertEqual(num_calls, 3)
+
+  def test_reraises_error_and_cancels_pending_fetches(self):
+    calls = []
+    release = threading.Event()
+
+    def get_next():
+      calls.append(len(calls))
+      if len(calls) == 1:
+        raise ValueError('exhausted')
+      # Keeps the worker busy, so that the fetches queued behind this one
+      # can only have been cancelled.
+      release.wait(timeout=10)
+      return len(calls)
+
+    prefetcher = eval_lib._InputPrefetcher(get_next, num_batches=-1, depth=3)
+    with self.assertRaisesRegex(ValueError, 'exhausted'):
+      prefetcher.get_next()
+    release.set()
+    prefetcher.close()
+    # The first failed, the second may have started already, and the third
+    # was cancelled.
+    self.assertLessEqual(len(calls), 2)
+
+  def test_close_stops_the_worker(self):
+    prefetcher = eval_lib._InputPrefetcher(
+        lambda: 0, num_batches=-1, depth=2)
+    self.assertEqual(prefetcher.get_next(), 0)
+    prefetcher.close()
+    self.assertEmpty(_prefetcher_threads())
+    # Closing twice is fine.
+    prefetcher.close()
+
+  def test_depth_0_fetches_synchronously(self):
+    prefetcher = eval_lib._InputPrefetcher(lambda: 0, num_batches=-1, depth=0)
+    self.assertEqual(prefetcher.get_next(), 0)
+    self.assertEmpty(_prefetcher_threads())
+    prefetcher.close()
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -170,6 +170,17 @@ def _to_ndarray(x: Any) -> Any:
   return x
 
 
+def _downcast_floats(x: Any) -> Any:
+  # Halves the size of the float outputs, e.g. scores or logprobs, at the cost
+  # of their precision. Values beyond the float16 range become +/-inf.
+  if isinstance(x, np.ndarray) and x.dtype in (np.float32, np.float64):
+    return x.astype(np.float16)
+  # Also covers the 0-d NumPy float scalars, and np.float64 is a float.
+  if isinstance(x, (float, np.floating)):
+    return np.float16(x)
+  return x
+
+
 class JnpEncoder(json.JSONEncoder):
   """jax.numpy compatible encoder: https://github.com/mpld3/mpld3/issues/434."""
 
@@ -195,12 +206,26 @@ class JnpEncoder(json.JSONEncoder):
 def write_key_value_pairs(filename: epath.PathLike,
                           key_value_pairs: Sequence[Tuple[Optional[str], Any]],
                           cast_to_ndarray: bool = True,
-                          write_pickle: bool = True) -> None:
-  """Writes `key_value_pairs` to pkl and jsonl files."""
+                          write_pickle: bool = True,
+                          downcast_floats: bool = False) -> None:
+  """Writes `key_value_pairs` to pkl and jsonl files.
+
+  Args:
+    filename: The output file name, whose suffix is replaced by .pickle and
+      .jsonl.
+    key_value_pairs: The (key, value) pairs to write.
+    cast_to_ndarray: Whether to convert the device arrays to np.ndarray.
+    write_pickle: Whether to write the .pickle file, next to the .jsonl one.
+    downcast_floats: Whether to write the float32/float64 np.ndarray values,
+      and the float scalars, as float16. Only the .pickle file gets smaller:
+      the .jsonl one holds the rounded values as text.
+  """
   filename = epath.Path(filename)
 
   if cast_to_ndarray:
     key_value_pairs = jax.tree_map(_to_ndarray, key_value_pairs)
+  if downcast_floats:
+    key_value_pairs = jax.tree_map(_downcast_floats, key_value_pairs)
 
   if write_pickle:
     with filename.with_suffix('.pickle').open('wb') as pkl_f:
@@ -211,6 +236,62 @@ def write_key_value_pairs(filename: epath.PathLike,
       jsonl_f.write(json.dumps(v, cls=JnpEncoder) + '\n')
 
 
+class KeyValuePairsWriter:
+  """Incrementally writes key-value pairs to pkl and jsonl files.
+
+  Produces the same files as `write_key_value_pairs`. The .jsonl lines are
+  written as the pairs come, while the pairs of the .pickle file are kept on
+  host and pickled as a single list by `close`, so that a single
+  `pickle.load` still reads all of them.
+
+  The files are written under a temporary name and only moved to their final
+  location by `close`, so that partially written outputs are never loaded.
+  """
+
+  def __init__(self,
+               filename: epath.PathLike,
+               cast_to_ndarray: bool = True,
+               write_pickle: bool = True,
+               downcast_floats: bool = False):
+    filename = epath.Path(filename)
+    self._cast_to_ndarray = cast_to_ndarray
+    self._downcast_floats = downcast_floats
+    self._fnames = [filename.with_suffix('.jsonl')]
+    if write_pickle:
+      self._fnames.append(filename.with_suffix('.pickle'))
+    self._tmp_fnames = [
+        fname.parent / f'{fname.name}.tmp' for fname in self._fnames
+    ]
+    self._jsonl_f = self._tmp_fnames[0].open('w')
+    self._pickled_pairs = [] if write_pickle else None
+    self.num_written = 0
+
+  def write(self, key_value_pairs: Sequence[Tuple[Optional[str], Any]]) -> None:
+    """Appends `key_value_pairs` to the output files."""
+    if self._cast_to_ndarray:
+      key_value_pairs = jax.tree_map(_to_ndarray, key_value_pairs)
+    if self._downcast_floats:
+      key_value_pairs = jax.tree_map(_downcast_floats, key_value_pairs)
+
+    if self._pickled_pairs is not None:
+      self._pickled_pairs.extend(key_value_pairs)
+
+    for _, v in key_value_pairs:
+      self._jsonl_f.write(json.dumps(v, cls=JnpEncoder) + '\n')
+    self.num_written += len(key_value_pairs)
+
+  def close(self) -> None:
+    """Closes the files and moves them to their final location."""
+    self._jsonl_f.close()
+    if self._pickled_pairs is not None:
+      with self._tmp_fnames[1].open('wb') as pkl_f:
+        pickle.dump(self._pickled_pairs, pkl_f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+      self._pickled_pairs = None
+    for tmp_fname, fname in zip(self._tmp_fnames, self._fnames):
+      tmp_fname.rename(fname)
+
+
 def _validate_filenames(filenames: Iterable[epath.PathLike],
                         step: Optional[int] = None) -> Tuple[int, int]:
   """Validates the list of file names."""
@@ -77,6 +77,46 @@ class IoUtilsTest(parameterized.TestCase):
     self.assertEqual(numpy.ndarray, type(kv_reload[1][1]))
     self.assertEqual(numpy.ndarray, type(kv_reload[2][1]))
 
+  def test_write_key_value_pairs_downcast_floats(self):
+    filename = epath.Path(FLAGS.test_tmpdir) / 'kvf.pickle'
+    kv = [
+        ('key1', {'scores': numpy.asarray([0.5, 0.25], dtype=numpy.float32)}),
+        ('key2', {'ids': numpy.asarray([7, 4], dtype=numpy.int64)}),
+    ]
+    io_utils.write_key_value_pairs(filename, kv, downcast_floats=True)
+    with filename.open('rb') as f:
+      kv_reload = pickle.load(f)
+    self.assertEqual(numpy.float16, kv_reload[0][1]['scores'].dtype)
+    numpy.testing.assert_array_equal([0.5, 0.25], kv_reload[0][1]['scores'])
+    self.assertEqual(numpy.int64, kv_reload[1][1]['ids'].dtype)
+
+  def test_write_key_value_pairs_downcast_float_scalars(self):
+    filename = epath.Path(FLAGS.test_tmpdir) / 'kvf_scalars.pickle'
+    kv = [
+        ('key1', {'score': numpy.float32(0.1), 'logprob': -0.2, 'num': 3}),
+    ]
+    io_utils.write_key_value_pairs(filename, kv, downcast_floats=True)
+    with filename.open('rb') as f:
+      kv_reload = pickle.load(f)
+    self.assertIsInstance(kv_reload[0][1]['score'], numpy.float16)
+    self.assertIsInstance(kv_reload[0][1]['logprob'], numpy.float16)
+    self.assertEqual(3, kv_reload[0][1]['num'])
+    self.assertNotIsInstance(kv_reload[0][1]['num'], numpy.float16)
+
+  def test_write_key_value_pairs_downcast_floats_jsonl(self):
+    filename = epath.Path(FLAGS.test_tmpdir) / 'kvf_jsonl.pickle'
+    kv = [
+        ('key1', {'scores': numpy.asarray([0.1, 0.5], dtype=numpy.float32),
+                  'logprob': -0.2}),
+    ]
+    io_utils.write_key_value_pairs(filename, kv, downcast_floats=True)
+    # The .jsonl file is text: it holds the float16 values, not less data.
+    jsonl_content = _read_jsonl_file(filename.with_suffix('.jsonl'))
+    self.assertEqual(
+        [{'scores': [float(numpy.float16(0.1)), 0.5],
+          'logprob': float(numpy.float16(-0.2))}],
+        jsonl_content)
+
   def test_validate_none_step_invalid(self):
     fnames = [f'decoder_out_200_shard_{x}.pickle' for x in range(3)]
     fnames.append('decoder_out_300_shard_0.pickle')
@@ -112,6 +152,27 @@ class IoUtilsTest(parameterized.TestCase):
     self.assertTrue(pathlib.Path(filename).exists())
     self.assertEqual(_read_jsonl_file(filename), [v for (_, v) in kv])
 
+  def test_key_value_pairs_writer(self):
+    basedir = epath.Path(FLAGS.test_tmpdir) / 'kv_writer'
+    filename = basedir / '1/eval_out/test_split/eval_out_100_shard_0'
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    kv = [('key1', {'out1': 1}), ('key2', {'out2': 2}), ('key3', {'out3': 3})]
+    writer = io_utils.KeyValuePairsWriter(filename)
+    writer.write(kv[:2])
+    writer.write(kv[2:])
+    # Outputs only become visible once the writer is closed.
+    self.assertFalse(filename.with_suffix('.pickle').exists())
+    writer.close()
+    self.assertEqual(writer.num_written, 3)
+    self.assertEqual(
+        _read_jsonl_file(filename.with_suffix('.jsonl')), [v for (_, v) in kv])
+    self.assertEqual(
+        io_utils.load_outputs(basedir, 'test_split', 'eval', step=100), kv)
+    # The .pickle file holds a single list, as with `write_key_value_pairs`.
+    with filename.with_suffix('.pickle').open('rb') as f:
+      self.assertEqual(pickle.load(f), kv)
+      self.assertEqual(f.read(), b'')
+
   @parameterized.named_parameters(
       ('_eval', io_utils.EvaluationMode.EVAL),
       ('_decode', io_utils.EvaluationMode.DECODE),
@@ -17,7 +17,7 @@
 
 import numbers
 import typing
-from typing import Any, Dict, Mapping, Optional, Sequence, Union
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple, Union
 
 from absl import logging
 import clu.values as clu_values
@@ -205,6 +205,80 @@ def is_float_convertible(metric_value: Union[numbers.Number, clu_values.Value,
            all(is_weighted_scalar(v) for v in metric_value)))
 
 
+def stacked_weighted_average_and_sum(
+    values: np.ndarray, weights: np.ndarray) -> Tuple[float, float]:
+  """Returns the weighted average and the sum of weights of stacked scalars.
+
+  Args:
+    values: The values of the weighted scalars, stacked along the first axis.
+    weights: Their weights, stacked along the first axis. Each weight is only
+      broadcast against its own value, as in `value * weight`.
+  """
+  ndim = max(values.ndim, weights.ndim)
+  values = values.reshape(
+      values.shape[:1] + (1,) * (ndim - values.ndim) + values.shape[1:])
+  weights = weights.reshape(
+      weights.shape[:1] + (1,) * (ndim - weights.ndim) + weights.shape[1:])
+  sum_weights = np.sum(weights)
+  return np.sum(values * weights) / sum_weights, sum_weights
+
+
+def weighted_average_and_sum(
+    weighted_scalars: Sequence[WeightedScalar]) -> Tuple[float, float]:
+  """Returns the weighted average and the sum of weights of weighted scalars.
+
+  Both are computed from the same stacked values and weights, in one pass.
+
+  Args:
+    weighted_scalars: A list of (value, weight) pairs.
+  """
+  values = np.stack([x[0] for x in weighted_scalars])
+  weights = np.stack([x[1] for x in weighted_scalars])
+  return stacked_weighted_average_and_sum(values, weights)
+
+
+class WeightedScalarBuffer:
+  """Accumulates the (value, weight) pairs of a metric in host arrays.
+
+  The values and the weights are written into arrays preallocated for the
+  expected number of pairs, in the dtype and shape of the first pair, and
+  doubled whenever they are full.
+  """
+
+  def __init__(self, capacity: int):
+    """Constructor.
+
+    Args:
+      capacity: The number of pairs the arrays are first allocated for.
+    """
+    self._capacity = max(capacity, 1)
+    self._values = None
+    self._weights = None
+    self._size = 0
+
+  def __len__(self) -> int:
+    return self._size
+
+  def append(self, weighted_scalar: WeightedScalar) -> None:
+    """Appends a (value, weight) pair of host values."""
+    value, weight = (np.asarray(x) for x in weighted_scalar)
+    if self._values is None:
+      self._values = np.empty((self._capacity,) + value.shape, value.dtype)
+      self._weights = np.empty((self._capacity,) + weight.shape, weight.dtype)
+    elif self._size == len(self._values):
+      self._values = np.concatenate([self._values, np.empty_like(self._values)])
+      self._weights = np.concatenate(
+          [self._weights, np.empty_like(self._weights)])
+    self._values[self._size] = value
+    self._weights[self._size] = weight
+    self._size += 1
+
+  def weighted_average_and_sum(self) -> Tuple[float, float]:
+    """Returns the weighted average and the sum of weights of the pairs."""
+    return stacked_weighted_average_and_sum(self._values[:self._size],
+                                            self._weights[:self._size])
+
+
 def as_float(
     metric_value: Union[numbers.Number, clu_values.Scalar, seqio.metrics.Scalar,
                         WeightedScalar, Sequence[WeightedScalar]]
@@ -215,9 +289,7 @@ def as_float(
 
   if isinstance(metric_value, list):
     assert all(is_weighted_scalar(v) for v in metric_value), metric_value
-    values = np.stack([x[0] for x in metric_value])
-    weights = np.stack([x[1] for x in metric_value])
-    return np.sum(values * weights) / np.sum(weights)
+    return weighted_average_and_sum(metric_value)[0]
   if isinstance(metric_value, (clu_values.Scalar, seqio.metrics.Scalar)):
     return metric_value.value
   assert isinstance(metric_value, numbers.Number), metric_value
@@ -242,6 +314,32 @@ def as_float_dict(
   return results
 
 
+def merged_as_float_dict(
+    *metric_outputs: Union[
+        Dict[str, Union[SummaryValueTypes]],
+        WeightedScalars,
+        WeightedScalarsList,
+        Mapping[str, Union[seqio.metrics.MetricValue, float]]]
+) -> Dict[str, float]:
+  """Returns a single float dict merged from heterogeneous metric outputs.
+
+  Equivalent to updating `as_float_dict(metric_outputs[0])` with the float
+  dicts of the next outputs in turn, but in a single pass over their items.
+
+  Args:
+    *metric_outputs: The metric outputs to convert, later ones taking
+      precedence over earlier ones for identical keys.
+  """
+  results = {}
+  for metric_output in metric_outputs:
+    for k, v in metric_output.items():
+      if isinstance(v, float):
+        results[k] = v
+      elif is_float_convertible(v):
+        results[k] = as_float(v)
+  return results
+
+
 def update_float_dict(target: Dict[str, float],
                       source: Dict[str, float],
                       prefix: Optional[str] = None) -> Dict[str, float]:
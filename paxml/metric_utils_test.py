@@ -238,6 +238,43 @@ class MetricUtilsTest(absltest.TestCase):
                                (np.array([3.0]), np.array([0.1]))]), 2.0)
     self.assertEqual(metric_utils.as_float((0.2, 1.0)), 0.2)
 
+  def test_weighted_average_and_sum(self):
+    weighted_average, sum_weights = metric_utils.weighted_average_and_sum(
+        [(np.array(1.0), np.array(1.0)), (np.array(4.0), np.array(3.0))])
+    self.assertAlmostEqual(weighted_average, 3.25)
+    self.assertAlmostEqual(sum_weights, 4.0)
+
+  def test_weighted_average_and_sum_broadcasts_weights_per_value(self):
+    weighted_average, sum_weights = metric_utils.weighted_average_and_sum(
+        [(np.array([1.0, 3.0]), np.array(1.0)),
+         (np.array([4.0, 6.0]), np.array(2.0))])
+    self.assertAlmostEqual(weighted_average, 8.0)
+    self.assertAlmostEqual(sum_weights, 3.0)
+
+  def test_weighted_scalar_buffer(self):
+    weighted_scalars = [(np.float64(1.0 + 1e-12), np.float64(1.0)),
+                        (np.float64(4.0), np.float64(3.0)),
+                        (np.float64(2.0), np.float64(0.5))]
+    # Starts too small, so that the arrays grow.
+    buffer = metric_utils.WeightedScalarBuffer(capacity=1)
+    for weighted_scalar in weighted_scalars:
+      buffer.append(weighted_scalar)
+    self.assertLen(buffer, 3)
+    weighted_average, sum_weights = buffer.weighted_average_and_sum()
+    expected_average, expected_sum_weights = (
+        metric_utils.weighted_average_and_sum(weighted_scalars))
+    self.assertEqual(weighted_average.dtype, np.float64)
+    self.assertEqual(weighted_average, expected_average)
+    self.assertEqual(sum_weights, expected_sum_weights)
+
+  def test_weighted_scalar_buffer_value_and_weight_shapes(self):
+    buffer = metric_utils.WeightedScalarBuffer(capacity=4)
+    buffer.append((np.array([1.0, 3.0]), np.array(1.0)))
+    buffer.append((np.array([4.0, 6.0]), np.array(2.0)))
+    weighted_average, sum_weights = buffer.weighted_average_and_sum()
+    self.assertAlmostEqual(weighted_average, 8.0)
+    self.assertAlmostEqual(sum_weights, 3.0)
+
   def test_as_float_dict(self):
     self.assertEqual(metric_utils.as_float_dict({'x': 0.2}), {'x': 0.2})
     self.assertEqual(
@@ -252,6 +289,22 @@ class MetricUtilsTest(absltest.TestCase):
             'y': 0.3
         })
 
+  def test_merged_as_float_dict(self):
+    self.assertEqual(
+        metric_utils.merged_as_float_dict(
+            {
+                'x': clu_values.Scalar(np.float32(1.0)),
+                'y': 0.3,
+                'z': clu_values.Text('abc')
+            }, {
+                'y': (np.array(2.0), np.array(1.0)),
+                'w': 4
+            }), {
+                'x': 1.0,
+                'y': 2.0,
+                'w': 4.0
+            })
+
   def test_merge_float_dict(self):
     m1 = {'a': 1, 'b': 2}
     self.assertEqual(
@@ -261,11 +261,23 @@ def aggregate_per_replica_summaries(summary_tensors: NestedJTensor):
 
 
 @contextlib.contextmanager
-def get_summary_writer(summary_dir: epath.Path) -> Iterator[SummaryWriter]:
-  """Context manager around Tensorflow's SummaryWriter."""
+def get_summary_writer(
+    summary_dir: epath.Path,
+    max_queue: Optional[int] = None) -> Iterator[SummaryWriter]:
+  """Context manager around Tensorflow's SummaryWriter.
+
+  Args:
+    summary_dir: The directory to write the summaries to.
+    max_queue: The maximum number of summaries buffered before they are
+      flushed to disk. Uses TensorFlow's default if None.
+
+  Yields:
+    The summary writer.
+  """
   if jax.process_index() == 0:
     logging.info('Opening SummaryWriter `%s`...', summary_dir)
-    summary_writer = tf_summary.create_file_writer(str(summary_dir))
+    summary_writer = tf_summary.create_file_writer(
+        str(summary_dir), max_queue=max_queue)
   else:
     # We create a dummy tf.summary.SummaryWriter() on non-zero tasks. This will
     # return a mock object, which acts like a summary writer, but does nothing,